@@ -0,0 +1,242 @@
+"""
+Microbenchmarks for the game engine and renderer.
+
+Times the hot parts of a click across board sizes and mine densities,
+with peak memory from tracemalloc, and writes the results as JSON so runs
+can be compared.
+
+    python bench.py
+    python bench.py --sizes 8 32 --densities 20 --out before.json
+    python bench.py --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import codec
+import minesweeper
+from board import clear_neighbour_tables, neighbour_table
+from minesweeper import Game
+
+
+def fake_request(session):
+    """just enough of a request for Game to load from"""
+    return SimpleNamespace(state=SimpleNamespace(session=session))
+
+
+def new_game(size, density):
+    game = Game(fake_request({}))
+    game.set_board_size(size)
+    game.set_mine_density(density)
+    return game
+
+
+def started_game(size, density):
+    game = new_game(size, density)
+    game.start_game(game.board.n // 2)
+    game.update_tiles_state()
+    return game
+
+
+def bench_game_init(size, density):
+    blob = codec.dumps(started_game(size, density).state)
+    return lambda: {"game": blob}, lambda session: Game(fake_request(session))
+
+
+def bench_start_game(size, density):
+    return lambda: new_game(size, density), lambda game: game.start_game(
+        game.board.n // 2
+    )
+
+
+def bench_find_neighbours(size, density):
+    def setup():
+        game = new_game(size, density)
+        game.create_mines(0)
+        return game
+
+    return setup, lambda game: game.find_neighbours()
+
+
+def bench_neighbour_table(size, density):
+    # built once per board shape, so this is the first game of a size
+    return clear_neighbour_tables, lambda _: neighbour_table(size, size)
+
+
+def bench_flood_fill(size, density):
+    # no mines at all, so one click opens the whole board
+    def setup():
+        game = new_game(size, 0)
+        game.state.game_started = True
+        game.find_neighbours()
+        return game
+
+    return setup, lambda game: game.remove_tiles(0)
+
+
+def bench_update_tiles_state(size, density):
+    def run(game):
+        game.update_tiles_state()
+        codec.dumps(game.state)
+
+    return lambda: started_game(size, density), run
+
+
+def bench_render_board(size, density):
+    def setup():
+        minesweeper.render_cache.clear()
+        return started_game(size, density)
+
+    return setup, lambda game: str(game.render_board())
+
+
+def bench_render_board_cached(size, density):
+    game = started_game(size, density)
+    str(game.render_board())
+    return lambda: game, lambda game: str(game.render_board())
+
+
+def bench_render_full(size, density):
+    def setup():
+        minesweeper.render_cache.clear()
+        return started_game(size, density)
+
+    return setup, lambda game: game.render_tiles()
+
+
+BENCHMARKS = {
+    "game_init": bench_game_init,
+    "start_game": bench_start_game,
+    "find_neighbours": bench_find_neighbours,
+    "neighbour_table": bench_neighbour_table,
+    "flood_fill": bench_flood_fill,
+    "update_tiles_state": bench_update_tiles_state,
+    "render_board": bench_render_board,
+    "render_board_cached": bench_render_board_cached,
+    "render_full": bench_render_full,
+}
+
+# these don't depend on the number of mines, so only run once per size
+DENSITY_FREE = {"flood_fill", "neighbour_table"}
+
+
+def measure(setup, run, repeat):
+    """time run() on fresh setup() results, then once more under tracemalloc"""
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        times.append(time.perf_counter() - start)
+
+    arg = setup()
+    tracemalloc.start()
+    run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "peak_bytes": peak,
+    }
+
+
+def run_all(names, sizes, densities, repeat, full_render_max):
+    results = []
+    for size in sizes:
+        for name in names:
+            if name == "render_full" and size > full_render_max:
+                continue
+            for density in [0] if name in DENSITY_FREE else densities:
+                setup, run = BENCHMARKS[name](size, density)
+                result = measure(setup, run, repeat)
+                result.update(name=name, size=size, density=density)
+                results.append(result)
+                print(
+                    f"{name:<20} size={size:<4} density={density:<3} "
+                    f"min={result['min']*1000:9.3f}ms "
+                    f"median={result['median']*1000:9.3f}ms "
+                    f"peak={result['peak_bytes']/1024:9.1f}KiB",
+                    flush=True,
+                )
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """print the change against an earlier run. returns how many got slower"""
+    with open(baseline_path) as f:
+        baseline = {
+            (r["name"], r["size"], r["density"]): r for r in json.load(f)["results"]
+        }
+    slower = 0
+    for r in results:
+        old = baseline.get((r["name"], r["size"], r["density"]))
+        if old is None or not old["min"]:
+            continue
+        ratio = r["min"] / old["min"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            slower += 1
+        print(
+            f"{r['name']:<20} size={r['size']:<4} density={r['density']:<3} "
+            f"{ratio:6.2f}x time  {r['peak_bytes'] / max(old['peak_bytes'], 1):6.2f}x memory{flag}"
+        )
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 32, 128, 512])
+    parser.add_argument("--densities", type=int, nargs="+", default=[20, 60, 100])
+    parser.add_argument(
+        "--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS)
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--full-render-max",
+        type=int,
+        default=32,
+        help="biggest board to render every tile of (domonic is slow past this)",
+    )
+    parser.add_argument("--out", default="bench_output.json")
+    parser.add_argument("--compare", help="an earlier --out file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown that counts as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_all(
+        args.only, args.sizes, args.densities, args.repeat, args.full_render_max
+    )
+    with open(args.out, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "numpy": codec.np is not None,
+                "time": time.time(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"wrote {args.out}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""
+Flat array-backed minesweeper board.
+
+Every cell lives at index ``row * cols + col`` in a handful of bytearrays,
+so a board is a few bytes per tile rather than a domonic element per tile.
+Which tiles neighbour which depends only on the board's shape, so that's
+worked out once per shape and shared by every board of it.
+"""
+
+import random
+from array import array
+from collections import deque
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, everything has a pure python path
+    np = None
+
+OFFSETS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+SMALL_TABLE = 128 * 128  # boards up to this many tiles keep more tables cached
+SMALL_TABLES = 32  # about 0.6MB each at most
+LARGE_TABLES = 2  # a 1000x1000 table is about 36MB
+
+
+def neighbour_table(rows, cols):
+    """(offsets, indices) for a rows x cols board, in CSR form.
+
+    The neighbours of tile i are ``indices[offsets[i]:offsets[i + 1]]``.
+    The arrays are shared by every board of the shape, so don't change them.
+    Only a couple of big ones are kept, since they take so much more room.
+    """
+    if rows * cols <= SMALL_TABLE:
+        return small_table(rows, cols)
+    return large_table(rows, cols)
+
+
+def clear_neighbour_tables():
+    small_table.cache_clear()
+    large_table.cache_clear()
+
+
+def build_neighbour_table(rows, cols):
+    n = rows * cols
+    if np is not None:
+        r, c = np.divmod(np.arange(n, dtype=np.int32), cols)
+        valid = np.empty((n, len(OFFSETS)), dtype=bool)
+        found = np.empty((n, len(OFFSETS)), dtype=np.uint32)
+        for k, (dr, dc) in enumerate(OFFSETS):
+            valid[:, k] = (
+                (0 <= r + dr) & (r + dr < rows) & (0 <= c + dc) & (c + dc < cols)
+            )
+            found[:, k] = (r + dr) * cols + c + dc
+        offsets = np.zeros(n + 1, dtype=np.uint32)
+        np.cumsum(valid.sum(axis=1), out=offsets[1:])
+        # straight from numpy's buffers, without a copy through bytes
+        table = array("I"), array("I")
+        table[0].frombytes(memoryview(offsets).cast("B"))
+        table[1].frombytes(memoryview(found[valid]).cast("B"))
+        return table
+
+    offsets = array("I", [0])
+    indices = array("I")
+    for row in range(rows):
+        for col in range(cols):
+            for dr, dc in OFFSETS:
+                r = row + dr
+                c = col + dc
+                if 0 <= r < rows and 0 <= c < cols:
+                    indices.append(r * cols + c)
+            offsets.append(len(indices))
+    return offsets, indices
+
+
+small_table = lru_cache(maxsize=SMALL_TABLES)(build_neighbour_table)
+large_table = lru_cache(maxsize=LARGE_TABLES)(build_neighbour_table)
+
+
+class Board(object):
+    """Mines, visibility, flags and neighbour counts for a rows x cols grid"""
+
+    def __init__(
+        self, rows, cols=None, mines=None, visible=None, flags=None, counts=None
+    ):
+        self.rows = rows
+        self.cols = rows if cols is None else cols
+        self.n = self.rows * self.cols
+        self.mines = bytearray(mines) if mines else bytearray(self.n)
+        self.visible = bytearray(visible) if visible else bytearray(self.n)
+        self.flags = bytearray(flags) if flags else bytearray(self.n)
+        self.counts = bytearray(counts) if counts else bytearray(self.n)
+        self.offsets, self.indices = neighbour_table(self.rows, self.cols)
+
+    @property
+    def revealed(self):
+        """number of uncovered safe tiles"""
+        return sum(v and not m for v, m in zip(self.visible, self.mines))
+
+    @property
+    def flag_count(self):
+        return self.flags.count(1)
+
+    @property
+    def mine_count(self):
+        return self.mines.count(1)
+
+    def index(self, row, col):
+        return row * self.cols + col
+
+    def coords(self, i):
+        return divmod(i, self.cols)
+
+    def neighbours(self, i):
+        """indexes of the (up to) 8 tiles surrounding i"""
+        return self.indices[self.offsets[i] : self.offsets[i + 1]]
+
+    def place_mines(self, k, first, rng=None):
+        """Set k random tiles as mines, never the first tile clicked.
+
+        Samples k indexes from the n - 1 other tiles and shifts any at or past
+        ``first`` along by one, so no candidate list is built.
+        Pass a seeded ``random.Random`` as rng for a repeatable layout.
+        """
+        k = min(k, self.n - 1)
+        if np is not None and rng is None:
+            picks = np.random.default_rng().choice(self.n - 1, size=k, replace=False)
+            picks[picks >= first] += 1
+            np.frombuffer(self.mines, dtype=np.uint8)[picks] = 1
+            return
+        for i in (rng or random).sample(range(self.n - 1), k):
+            self.mines[i if i < first else i + 1] = 1
+
+    def count_neighbours(self):
+        """fill in the neighbouring mine count for every tile in one pass"""
+        rows, cols = self.rows, self.cols
+        if np is not None:
+            mines = np.frombuffer(self.mines, dtype=np.uint8).reshape(rows, cols)
+            padded = np.zeros((rows + 2, cols + 2), dtype=np.uint8)
+            padded[1:-1, 1:-1] = mines
+            total = np.zeros((rows, cols), dtype=np.uint8)
+            for dr in range(3):
+                for dc in range(3):
+                    total += padded[dr : dr + rows, dc : dc + cols]
+            self.counts[:] = (total - mines).tobytes()
+            return
+
+        # sum each row with its left/right shifts, then each of those with the
+        # rows above and below. the tile itself is counted once, so take it off
+        mines = self.mines
+        pad = [0] * cols
+        across = []
+        for r in range(rows):
+            row = mines[r * cols : (r + 1) * cols]
+            left = b"\0" + row[:-1]
+            right = row[1:] + b"\0"
+            across.append([a + b + c for a, b, c in zip(left, row, right)])
+        counts = bytearray()
+        for r in range(rows):
+            above = across[r - 1] if r else pad
+            below = across[r + 1] if r + 1 < rows else pad
+            row = mines[r * cols : (r + 1) * cols]
+            counts += bytes(
+                [a + b + c - m for a, b, c, m in zip(above, across[r], below, row)]
+            )
+        self.counts[:] = counts
+
+    def reveal(self, i):
+        """Uncover tile i, flooding out through tiles with no neighbouring mines.
+
+        Returns the indexes that were newly uncovered, in the order they opened.
+        """
+        visible = self.visible
+        flags = self.flags
+        counts = self.counts
+        if visible[i] or flags[i]:
+            return []
+
+        visible[i] = 1
+        revealed = [i]
+        if self.mines[i] or counts[i]:
+            return revealed
+
+        offsets = self.offsets
+        indices = self.indices
+        queue = deque([i])
+        while queue:
+            j = queue.popleft()
+            for k in indices[offsets[j] : offsets[j + 1]]:
+                if visible[k] or flags[k]:
+                    continue
+                visible[k] = 1
+                revealed.append(k)
+                if not counts[k]:
+                    queue.append(k)
+        return revealed
+
+    def chord(self, i):
+        """Uncover every unflagged neighbour of a number whose mines are all flagged.
+
+        Returns the newly uncovered indexes, which include a mine if a flag was wrong.
+        """
+        if not self.visible[i] or self.mines[i] or not self.counts[i]:
+            return []
+        around = self.neighbours(i)
+        if sum(self.flags[j] for j in around) != self.counts[i]:
+            return []
+        revealed = []
+        for j in around:
+            revealed.extend(self.reveal(j))
+        return revealed
+
+    def mine_indexes(self):
+        return [i for i in range(self.n) if self.mines[i]]
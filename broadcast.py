@@ -0,0 +1,97 @@
+"""
+Fan-out of game changes to watchers over Server-Sent Events.
+
+Each channel (a shared game) has a set of subscribers, each with its own
+bounded asyncio.Queue. A change is encoded into an SSE message once and the
+same bytes are put on every queue. A subscriber whose queue is full is too
+slow to keep up, so it's dropped rather than letting it hold up the rest or
+buffer without end. Its stream ends and the browser's EventSource
+reconnects, starting over from the whole board.
+"""
+
+import asyncio
+import json
+from collections import defaultdict
+
+PING = b": ping\n\n"
+CLOSED = None
+
+
+def message(event, data):
+    """an SSE message, as bytes"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class Hub(object):
+    def __init__(self, queue_size=64, ping=15):
+        self.queue_size = queue_size
+        self.ping = ping  # seconds. keeps proxies from closing quiet streams
+        self.channels = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def watching(self, channel):
+        return bool(self.channels.get(channel))
+
+    def subscribe(self, channel):
+        queue = asyncio.Queue(self.queue_size)
+        self.channels[channel].add(queue)
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self.channels[channel]
+
+    def publish(self, channel, event, data):
+        """send to everyone on channel. encoded once, whoever's listening"""
+        subscribers = self.channels.get(channel)
+        if not subscribers:
+            return 0
+        encoded = message(event, data)
+        self.published += 1
+        for queue in list(subscribers):
+            try:
+                queue.put_nowait(encoded)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self.drop(channel, queue)
+        return len(subscribers)
+
+    def drop(self, channel, queue):
+        """cut off a subscriber that isn't keeping up"""
+        self.unsubscribe(channel, queue)
+        self.dropped += 1
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(CLOSED)
+
+    async def stream(self, channel, first=None):
+        """the bytes for one subscriber's response, starting with first"""
+        queue = self.subscribe(channel)
+        try:
+            if first is not None:
+                yield first
+            while True:
+                try:
+                    encoded = await asyncio.wait_for(queue.get(), self.ping)
+                except asyncio.TimeoutError:
+                    yield PING
+                    continue
+                if encoded is CLOSED:
+                    return
+                yield encoded
+        finally:
+            self.unsubscribe(channel, queue)
+
+    def stats(self):
+        return {
+            "channels": len(self.channels),
+            "subscribers": sum(len(s) for s in self.channels.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
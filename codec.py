@@ -0,0 +1,146 @@
+"""
+Compact binary encoding of GameData for the session store.
+
+A game is a fixed header followed by the board buffers packed as tightly
+as they go: mines, visibility and flags one bit per tile, neighbour counts
+one nibble per tile. Images and neighbour lists are derived again on load.
+
+    version:B  rows:I  cols:I  mine_count:I  flag_count:I  status:B  timer:q
+    mines bits | visible bits | flags bits | counts nibbles
+
+The buffers are left off until a game has tiles.
+"""
+
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, everything has a pure python path
+    np = None
+
+VERSION = 2
+
+HEADER = struct.Struct(">BIIIIBq")
+
+GAME_OVER = 1
+GAME_STARTED = 2
+HAS_TILES = 4
+MAY_GUESS = 8  # dealt the classic way when it should have been no-guess
+UNRANKED = 16  # played in a cookie session, so it can have been rolled back
+
+_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_FROM_DIGITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def pack_bits(buf):
+    """0/1 bytes -> bitset. tile i is bit i % 8 of byte i // 8"""
+    n = len(buf)
+    if np is not None:
+        return np.packbits(
+            np.frombuffer(bytes(buf), dtype=np.uint8), bitorder="little"
+        ).tobytes()
+    digits = bytes(buf).translate(_TO_DIGITS)[::-1]
+    return int(digits or b"0", 2).to_bytes((n + 7) // 8, "little")
+
+
+def unpack_bits(data, n):
+    """bitset -> bytearray of n 0/1 bytes"""
+    if np is not None:
+        bits = np.unpackbits(
+            np.frombuffer(data, dtype=np.uint8), count=n, bitorder="little"
+        )
+        return bytearray(bits.tobytes())
+    digits = format(int.from_bytes(data, "little"), f"0{n}b").encode()[::-1]
+    return bytearray(digits[:n].translate(_FROM_DIGITS))
+
+
+def pack_nibbles(buf):
+    """values 0-15 -> two per byte, low nibble first"""
+    buf = bytes(buf)
+    if len(buf) % 2:
+        buf += b"\0"
+    if np is not None:
+        values = np.frombuffer(buf, dtype=np.uint8)
+        return (values[0::2] | values[1::2] << 4).tobytes()
+    return bytes(a | b << 4 for a, b in zip(buf[0::2], buf[1::2]))
+
+
+def unpack_nibbles(data, n):
+    """nibbles -> bytearray of n values"""
+    if np is not None:
+        packed = np.frombuffer(data, dtype=np.uint8)
+        values = np.empty(len(packed) * 2, dtype=np.uint8)
+        values[0::2] = packed & 15
+        values[1::2] = packed >> 4
+        return bytearray(values[:n].tobytes())
+    out = bytearray(len(data) * 2)
+    out[0::2] = bytes(v & 15 for v in data)
+    out[1::2] = bytes(v >> 4 for v in data)
+    return out[:n]
+
+
+def dumps(state):
+    """GameData -> bytes"""
+    status = (
+        (GAME_OVER if state.game_over else 0)
+        | (GAME_STARTED if state.game_started else 0)
+        | (HAS_TILES if state.mines else 0)
+        | (MAY_GUESS if state.may_guess else 0)
+        | (UNRANKED if state.unranked else 0)
+    )
+    header = HEADER.pack(
+        VERSION,
+        state.rows,
+        state.cols,
+        state.mine_count,
+        state.flag_count,
+        status,
+        int(state.game_timer_start),
+    )
+    if not state.mines:
+        return header
+    return b"".join(
+        [
+            header,
+            pack_bits(state.mines),
+            pack_bits(state.visible),
+            pack_bits(state.flags),
+            pack_nibbles(state.counts),
+        ]
+    )
+
+
+def loads(blob, state):
+    """fill the GameData state from bytes made by dumps. returns the state"""
+    version = blob[0]
+    if version == VERSION:
+        (
+            _,
+            state.rows,
+            state.cols,
+            state.mine_count,
+            state.flag_count,
+            status,
+            state.game_timer_start,
+        ) = HEADER.unpack_from(blob)
+        pos = HEADER.size
+    else:
+        raise ValueError(f"unknown game encoding version {version}")
+    state.game_over = bool(status & GAME_OVER)
+    state.game_started = bool(status & GAME_STARTED)
+    state.may_guess = bool(status & MAY_GUESS)
+    state.unranked = bool(status & UNRANKED)
+
+    if not status & HAS_TILES:
+        state.mines = state.visible = state.flags = state.counts = b""
+        return state
+
+    n = state.rows * state.cols
+    bits = (n + 7) // 8
+    buffers = []
+    for _ in range(3):
+        buffers.append(bytes(unpack_bits(blob[pos : pos + bits], n)))
+        pos += bits
+    state.mines, state.visible, state.flags = buffers
+    state.counts = bytes(unpack_nibbles(blob[pos:], n))
+    return state
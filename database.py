@@ -0,0 +1,42 @@
+"""
+A SQLite database in WAL mode, shared by every worker process.
+
+Each process opens its own connection the first time it's used, since a
+connection made before a fork mustn't be used by the children too. The
+tables and indexes are created then. Statements on it run one at a time.
+
+    db = Database("sessions.db", "CREATE TABLE IF NOT EXISTS ...")
+    db.execute("SELECT data FROM sessions WHERE id = ?", session_id)
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class Database(object):
+    def __init__(self, path, *schema):
+        self.path = path
+        self.schema = schema  # run on each new connection
+        self.mutex = threading.Lock()  # held while a statement runs
+        self._db = None
+        self._pid = None
+
+    @property
+    def db(self):
+        # one connection per process. forked workers mustn't share one
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            for sql in self.schema:
+                db.execute(sql)
+            self._db = db
+            self._pid = os.getpid()
+        return self._db
+
+    def execute(self, sql, *args):
+        with self.mutex:
+            return self.db.execute(sql, args)
@@ -0,0 +1,112 @@
+"""
+Games stored as what happened, rather than what the board looks like.
+
+A game is its size, mine count, the seed its mines are placed with, and
+the moves made so far, so a session holds a few bytes per click whatever
+the size of the board:
+
+    version:B  rows:I  cols:I  mine_count:I  seed:Q  timer:q
+    moves, 4 bytes each: tile << 2 | action
+
+The first move is the first click. The board is rebuilt by placing the
+mines from the seed and playing the moves again, which also means any game
+can be replayed exactly. To keep that cheap, snapshots of the board are
+kept in memory every so many moves, and only the moves since the latest
+one are played again.
+"""
+
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+
+VERSION = 3  # after codec's, so the first byte says which a blob is
+
+HEADER = struct.Struct(">BIIIQq")
+
+MOVE = 0
+FLAG = 1
+CHORD = 2
+
+ACTIONS = {MOVE: "move", FLAG: "flag", CHORD: "chord"}
+
+
+def is_log(blob):
+    return bool(blob) and blob[0] == VERSION
+
+
+def dumps(state, moves):
+    """GameData and its moves -> bytes"""
+    header = HEADER.pack(
+        VERSION,
+        state.rows,
+        state.cols,
+        state.mine_count,
+        state.seed,
+        int(state.game_timer_start),
+    )
+    moves = array("I", moves)
+    if sys.byteorder == "little":
+        moves.byteswap()
+    return header + moves.tobytes()
+
+
+def loads(blob, state):
+    """fill in the header fields of state -> the moves"""
+    (
+        _,
+        state.rows,
+        state.cols,
+        state.mine_count,
+        state.seed,
+        state.game_timer_start,
+    ) = HEADER.unpack_from(blob)
+    moves = array("I", blob[HEADER.size :])
+    if sys.byteorder == "little":
+        moves.byteswap()
+    return moves
+
+
+def decode(move):
+    """-> (action, tile index)"""
+    return move & 3, move >> 2
+
+
+def encode(action, i):
+    return i << 2 | action
+
+
+class Snapshots(object):
+    """the latest board snapshot of recent games, by seed. a bounded LRU"""
+
+    def __init__(self, max_games=1024):
+        self.max_games = max_games
+        self.games = OrderedDict()  # seed -> (moves played, codec blob)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, seed, played):
+        """the latest snapshot of at most played moves -> (moves, blob) or None"""
+        found = self.games.get(seed)
+        if found is None or found[0] > played:
+            self.misses += 1
+            return None
+        self.games.move_to_end(seed)
+        self.hits += 1
+        return found
+
+    def put(self, seed, played, blob):
+        self.games[seed] = (played, blob)
+        self.games.move_to_end(seed)
+        while len(self.games) > self.max_games:
+            self.games.popitem(last=False)
+
+    def stats(self):
+        looked = self.hits + self.misses
+        return {
+            "games": len(self.games),
+            "bytes": sum(len(blob) for _, blob in self.games.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / looked if looked else 0.0,
+        }
@@ -0,0 +1,295 @@
+"""
+No-guess board generation, and a pool of boards made ahead of time.
+
+A no-guess board is one the solver can finish from the first click, so the
+player never has to take a 50/50. Boards are made for a first-click
+region, a block of tiles: the block and a ring of tiles around it are kept
+free of mines, so a click anywhere in the block is a 0 and opens exactly
+the same area. That's what lets a board be made before anyone clicks.
+
+Making one means placing mines at random until the solver can finish it,
+which can take many tries on a dense board, so that happens in worker
+processes. BoardPool keeps a few boards ready for each
+(rows, cols, mines, region) of the shapes played lately, and tops them up
+as they're taken.
+"""
+
+import random
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from time import monotonic, perf_counter
+
+import solver
+from board import Board
+
+
+def region_of(cols, i, size):
+    """the first-click region tile i is in"""
+    row, col = divmod(i, cols)
+    return row // size, col // size
+
+
+def region_tiles(rows, cols, region, size, ring=0):
+    """indexes of the tiles in a region, and ring tiles further round it"""
+    top = region[0] * size
+    left = region[1] * size
+    return [
+        r * cols + c
+        for r in range(max(top - ring, 0), min(top + size + ring, rows))
+        for c in range(max(left - ring, 0), min(left + size + ring, cols))
+    ]
+
+
+def solvable(board, first):
+    """can the solver clear the board from the first click without guessing.
+    leaves the board covered again"""
+    board.reveal(first)
+    while True:
+        safe, _ = solver.solve(board)
+        if not safe:
+            break
+        for i in safe:
+            board.reveal(i)
+    done = board.revealed == board.n - board.mine_count
+    board.visible[:] = bytes(board.n)
+    return done
+
+
+def generate(rows, cols, mines, region, size=3, attempts=200, seed=None):
+    """-> (mines as bytes or None if it gave up, boards tried, seconds taken)"""
+    start = perf_counter()
+    rng = random.Random(seed)
+    block = region_tiles(rows, cols, region, size)
+    keep_clear = set(region_tiles(rows, cols, region, size, ring=1))
+    candidates = [i for i in range(rows * cols) if i not in keep_clear]
+    if not block or mines > len(candidates):
+        return None, 0, perf_counter() - start
+
+    first = block[len(block) // 2]
+    for tried in range(1, attempts + 1):
+        board = Board(rows, cols)
+        for i in rng.sample(candidates, mines):
+            board.mines[i] = 1
+        board.count_neighbours()
+        if solvable(board, first):
+            return bytes(board.mines), tried, perf_counter() - start
+    return None, attempts, perf_counter() - start
+
+
+class BoardPool(object):
+    """ready no-guess boards, by (rows, cols, mines, region).
+
+    take() never waits. it hands over a ready board if there is one and
+    asks for more in the background either way. only the board shapes,
+    (rows, cols, mines), asked for most recently are kept filled, and
+    a shape pushed out drops its ready boards and cancels what's queued
+    for it. a few boards are made at a time, the shape asked for last
+    first, so the key a player is about to click on doesn't wait behind
+    every region of every shape.
+    """
+
+    def __init__(
+        self,
+        depth=2,
+        workers=2,
+        region=3,
+        max_tiles=4096,
+        attempts=200,
+        shapes=4,
+        max_ready=512,
+        max_pending=None,
+        retry=600,
+    ):
+        self.depth = depth  # boards ready or on the way per key
+        self.workers = workers
+        self.region = region
+        self.max_tiles = max_tiles
+        self.attempts = attempts
+        self.max_shapes = shapes  # board shapes kept filled
+        self.max_ready = max_ready  # boards ready or on the way in all
+        self.max_pending = max_pending or workers * 2  # boards being made at once
+        self.executor = None
+        self.lock = threading.Lock()
+        self.shapes = OrderedDict()  # (rows, cols, mines), least recently used first
+        self.want = OrderedDict()  # keys short of boards, most wanted first
+        self.ready = defaultdict(deque)
+        self.pending = defaultdict(set)  # key -> futures making boards for it
+        self.making = set()  # every unfinished future, wanted or not
+        self.closed = False
+        self.impossible = {}  # key -> when boards for it were last given up on
+        self.retry = retry  # seconds before a key given up on is tried again
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.gave_up = 0
+        self.tried = 0
+        self.seconds = 0.0
+        self.evicted = 0
+
+    def usable(self, rows, cols, mines):
+        return rows * cols <= self.max_tiles and mines < rows * cols
+
+    def regions(self, rows, cols):
+        return [
+            (r, c)
+            for r in range(-(-rows // self.region))
+            for c in range(-(-cols // self.region))
+        ]
+
+    def take(self, rows, cols, mines, first):
+        """mines for a board whose first click is tile first, or None"""
+        if not self.usable(rows, cols, mines):
+            return None
+        key = (rows, cols, mines, region_of(cols, first, self.region))
+        with self.lock:
+            ready = self.ready[key]
+            board = ready.popleft() if ready else None
+            if board is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            cancel = self.use((rows, cols, mines), [key])
+        self.cancel(cancel)
+        self.pump()
+        return board
+
+    def prepare(self, rows, cols, mines):
+        """start making boards for every region of a board, before the first click"""
+        if not self.usable(rows, cols, mines):
+            return
+        keys = [(rows, cols, mines, region) for region in self.regions(rows, cols)]
+        with self.lock:
+            cancel = self.use((rows, cols, mines), keys)
+        self.cancel(cancel)
+        self.pump()
+
+    def use(self, shape, keys):
+        """shape is the most recently used, and keys the most wanted, in order.
+        holds the lock. returns the futures of shapes pushed out, to cancel"""
+        self.shapes[shape] = None
+        self.shapes.move_to_end(shape)
+        for key in reversed(keys):
+            if not self.given_up(key):
+                self.want[key] = None
+                self.want.move_to_end(key, last=False)
+        cancel = []
+        while len(self.shapes) > self.max_shapes:
+            dropped, _ = self.shapes.popitem(last=False)
+            for key in [key for key in self.want if key[:3] == dropped]:
+                del self.want[key]
+            for key in [key for key in self.impossible if key[:3] == dropped]:
+                del self.impossible[key]
+            for key in [key for key in self.ready if key[:3] == dropped]:
+                self.evicted += len(self.ready.pop(key))
+            for key in [key for key in self.pending if key[:3] == dropped]:
+                cancel.extend(self.pending.pop(key))
+        return cancel
+
+    def given_up(self, key):
+        """was key given up on lately. holds the lock"""
+        when = self.impossible.get(key)
+        if when is None:
+            return False
+        if monotonic() - when > self.retry:
+            # one unlucky run of attempts shouldn't rule it out for good
+            del self.impossible[key]
+            return False
+        return True
+
+    def cancel(self, futures):
+        # not under the lock. a cancelled future's callback runs right away
+        for future in futures:
+            future.cancel()
+
+    def pump(self):
+        """start making boards for the most wanted keys, while there's room"""
+        started = []
+        with self.lock:
+            if self.closed:
+                return
+            held = sum(len(boards) for boards in self.ready.values())
+            # boards for shapes pushed out still hold a worker until they're done
+            making = len(self.making)
+            while self.want and making < self.max_pending:
+                if held + making >= self.max_ready:
+                    break
+                key = next(iter(self.want))
+                if len(self.ready[key]) + len(self.pending[key]) >= self.depth:
+                    del self.want[key]
+                    continue
+                if self.executor is None:
+                    self.executor = ProcessPoolExecutor(self.workers)
+                try:
+                    future = self.executor.submit(
+                        generate, *key, size=self.region, attempts=self.attempts
+                    )
+                except RuntimeError:
+                    # the interpreter is shutting down
+                    break
+                self.pending[key].add(future)
+                self.making.add(future)
+                making += 1
+                started.append((key, future))
+        # a future already finished runs its callback straight away, so
+        # callbacks are added once the lock is let go
+        for key, future in started:
+            future.add_done_callback(lambda f, key=key: self.done(key, f))
+
+    def done(self, key, future):
+        """a worker finished, runs on the executor's thread"""
+        with self.lock:
+            self.making.discard(future)
+            self.keep(key, future)
+        # a worker is free
+        self.pump()
+
+    def keep(self, key, future):
+        """the board a finished future made, if it's still wanted. holds the lock"""
+        futures = self.pending.get(key)
+        if futures is None or future not in futures:
+            # its shape was pushed out. nobody wants the board now
+            return
+        futures.discard(future)
+        if not futures:
+            del self.pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        mines, tried, seconds = future.result()
+        self.tried += tried
+        self.seconds += seconds
+        if mines is None:
+            # maybe too dense to finish without guessing. stop asking for a while
+            self.gave_up += 1
+            self.impossible[key] = monotonic()
+            self.want.pop(key, None)
+            return
+        self.generated += 1
+        self.ready[key].append(mines)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stats(self):
+        with self.lock:
+            taken = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / taken if taken else 0.0,
+                "shapes": len(self.shapes),
+                "ready": sum(len(boards) for boards in self.ready.values()),
+                "pending": sum(len(futures) for futures in self.pending.values()),
+                "wanted": len(self.want),
+                "generated": self.generated,
+                "gave_up": self.gave_up,
+                "evicted": self.evicted,
+                "boards_tried": self.tried,
+                "boards_per_second": (
+                    self.generated / self.seconds if self.seconds else 0.0
+                ),
+            }
@@ -0,0 +1,306 @@
+"""
+A board with no edges, made a chunk at a time as it's explored.
+
+The plane is cut into square chunks. A chunk's mines come from the game's
+seed and the chunk's coordinates, so they're never stored: they're made
+again whenever they're needed, and the mines and neighbour counts of
+recently used chunks are cached for every game. A game only keeps what the
+player did, which tiles are uncovered and flagged, and only for chunks it
+has touched. Chunks not touched for a while are packed down to bits, and
+a chunk nobody touched at all takes no room.
+
+The tiles around the first click are kept clear, like a normal game, and
+tiles are addressed by (row, col) anywhere on the plane, negative too.
+
+    version:B  seed:Q  density:H (per mille)  chunk:H  start row:q  start col:q
+    status:B  revealed:Q
+    then for each touched chunk  row:i  col:i  visible bits | flags bits
+"""
+
+import random
+import struct
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+import codec
+
+VERSION = 1
+
+HEADER = struct.Struct(">BQHHqqBQ")
+CHUNK_KEY = struct.Struct(">ii")
+
+EDGE = 1 << 30  # furthest a row or col can be from 0, so chunk keys fit in ">ii"
+
+STARTED = 1
+GAME_OVER = 2
+
+CHUNK = 32  # tiles along each side of a chunk
+OFFSETS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+@lru_cache(maxsize=4096)
+def layout(seed, density, size, start, cr, cc):
+    """the mines of chunk cr, cc as 0/1 bytes. the same every time"""
+    mines = bytearray(size * size)
+    count = round(size * size * density / 1000)
+    rng = random.Random(f"{seed}:{cr}:{cc}")
+    for i in rng.sample(range(size * size), count):
+        mines[i] = 1
+    # no mines around the first click
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            r, c = start[0] + dr, start[1] + dc
+            if (r // size, c // size) == (cr, cc):
+                mines[(r % size) * size + c % size] = 0
+    return bytes(mines)
+
+
+@lru_cache(maxsize=1024)
+def neighbour_counts(seed, density, size, start, cr, cc):
+    """the neighbouring mine count of every tile in chunk cr, cc"""
+    # the chunk with a border of its neighbours' mines round it
+    grid = [
+        layout(seed, density, size, start, cr + dr, cc + dc)
+        for dr in (-1, 0, 1)
+        for dc in (-1, 0, 1)
+    ]
+    rows = []
+    for r in range(-1, size + 1):
+        left, middle, right = grid[(r // size + 1) * 3 :][:3]
+        at = r % size * size
+        rows.append(
+            left[at + size - 1 : at + size]
+            + middle[at : at + size]
+            + right[at : at + 1]
+        )
+    # sum each row with its left/right shifts, then with the rows above and below
+    across = [[a + b + c for a, b, c in zip(row, row[1:], row[2:])] for row in rows]
+    counts = bytearray()
+    for r in range(size):
+        mines = rows[r + 1][1:-1]
+        counts += bytes(
+            a + b + c - m
+            for a, b, c, m in zip(across[r], across[r + 1], across[r + 2], mines)
+        )
+    return bytes(counts)
+
+
+class Chunk(object):
+    """what the player has done in one chunk"""
+
+    def __init__(self, mines, counts, visible=None, flags=None):
+        n = len(mines)
+        self.mines = mines
+        self.counts = counts
+        self.visible = bytearray(visible) if visible else bytearray(n)
+        self.flags = bytearray(flags) if flags else bytearray(n)
+
+    @property
+    def touched(self):
+        return 1 in self.visible or 1 in self.flags
+
+
+class InfiniteBoard(object):
+    """an endless board for one game. chunks are made as they're reached"""
+
+    def __init__(self, seed, density=160, size=CHUNK, hot=64, max_reveal=1 << 16):
+        self.seed = seed
+        self.density = density  # mines per thousand tiles
+        self.size = size
+        self.hot_max = hot  # chunks kept unpacked
+        self.max_reveal = max_reveal  # most tiles one click opens
+        self.start = None  # the first click
+        self.game_over = False
+        self.revealed = 0
+        self.hot = OrderedDict()  # (cr, cc) -> Chunk
+        self.cold = {}  # (cr, cc) -> packed visible and flags bits
+
+    def locate(self, row, col):
+        """-> (chunk key, index in the chunk)"""
+        cr, r = divmod(row, self.size)
+        cc, c = divmod(col, self.size)
+        return (cr, cc), r * self.size + c
+
+    def chunk(self, key):
+        """the chunk at key, unpacked or made if needs be"""
+        found = self.hot.get(key)
+        if found is not None:
+            self.hot.move_to_end(key)
+            return found
+        n = self.size * self.size
+        field = (self.seed, self.density, self.size, self.start, *key)
+        visible = flags = None
+        packed = self.cold.pop(key, None)
+        if packed is not None:
+            bits = (n + 7) // 8
+            visible = codec.unpack_bits(packed[:bits], n)
+            flags = codec.unpack_bits(packed[bits:], n)
+        if self.start is None:
+            # nothing is placed until the first click
+            found = Chunk(bytes(n), bytes(n), visible, flags)
+        else:
+            found = Chunk(layout(*field), neighbour_counts(*field), visible, flags)
+        self.hot[key] = found
+        self.evict()
+        return found
+
+    def evict(self):
+        """pack the least recently used chunks past the hot limit"""
+        while len(self.hot) > self.hot_max:
+            key, chunk = self.hot.popitem(last=False)
+            if chunk.touched:
+                self.cold[key] = codec.pack_bits(chunk.visible) + codec.pack_bits(
+                    chunk.flags
+                )
+
+    def tile(self, row, col):
+        """'' covered, 'F' flagged, '*' an uncovered mine or '0'-'8'"""
+        key, i = self.locate(row, col)
+        if self.start is None and key not in self.hot and key not in self.cold:
+            return ""
+        chunk = self.chunk(key)
+        if chunk.flags[i]:
+            return "F"
+        if self.game_over and chunk.mines[i]:
+            return "*"
+        if not chunk.visible[i]:
+            return ""
+        return "*" if chunk.mines[i] else str(chunk.counts[i])
+
+    def view(self, row, col, rows, cols):
+        """rows of tiles, as tile() shows them, for a window onto the board"""
+        return [
+            [self.tile(r, c) for c in range(col, col + cols)]
+            for r in range(row, row + rows)
+        ]
+
+    def begin(self, row, col):
+        """the first click. mines are placed, clear of it"""
+        self.start = (row, col)
+        # chunks made before now have no mines in them
+        for key, chunk in list(self.hot.items()):
+            field = (self.seed, self.density, self.size, self.start, *key)
+            chunk.mines = layout(*field)
+            chunk.counts = neighbour_counts(*field)
+
+    def reveal(self, row, col):
+        """Uncover a tile, flooding out through tiles with no neighbouring mines,
+        across chunks. Returns the (row, col) of each tile uncovered."""
+        if self.game_over:
+            return []
+        if self.start is None:
+            self.begin(row, col)
+        key, i = self.locate(row, col)
+        chunk = self.chunk(key)
+        if chunk.visible[i] or chunk.flags[i]:
+            return []
+
+        chunk.visible[i] = 1
+        revealed = [(row, col)]
+        if chunk.mines[i]:
+            self.game_over = True
+            return revealed
+        if chunk.counts[i]:
+            self.revealed += 1
+            return revealed
+
+        queue = deque([(row, col)])
+        while queue and len(revealed) < self.max_reveal:
+            r, c = queue.popleft()
+            for dr, dc in OFFSETS:
+                key, i = self.locate(r + dr, c + dc)
+                chunk = self.hot.get(key) or self.chunk(key)
+                if chunk.visible[i] or chunk.flags[i]:
+                    continue
+                chunk.visible[i] = 1
+                revealed.append((r + dr, c + dc))
+                if not chunk.counts[i]:
+                    queue.append((r + dr, c + dc))
+        self.revealed += len(revealed)
+        return revealed
+
+    def flag(self, row, col):
+        """put a flag on a covered tile, or take it off"""
+        if self.game_over:
+            return []
+        key, i = self.locate(row, col)
+        chunk = self.chunk(key)
+        if chunk.visible[i]:
+            return []
+        chunk.flags[i] ^= 1
+        return [(row, col)]
+
+    def chord(self, row, col):
+        """uncover the unflagged neighbours of a number that has all its flags"""
+        key, i = self.locate(row, col)
+        chunk = self.chunk(key)
+        if self.game_over or not chunk.visible[i] or chunk.mines[i]:
+            return []
+        around = [(row + dr, col + dc) for dr, dc in OFFSETS]
+        flagged = 0
+        for r, c in around:
+            key, j = self.locate(r, c)
+            flagged += self.chunk(key).flags[j]
+        if not chunk.counts[i] or flagged != chunk.counts[i]:
+            return []
+        revealed = []
+        for r, c in around:
+            revealed.extend(self.reveal(r, c))
+        return revealed
+
+    def dumps(self):
+        """the game -> bytes. untouched chunks are left out"""
+        self.evict()
+        status = (STARTED if self.start is not None else 0) | (
+            GAME_OVER if self.game_over else 0
+        )
+        start = self.start or (0, 0)
+        parts = [
+            HEADER.pack(
+                VERSION,
+                self.seed,
+                self.density,
+                self.size,
+                *start,
+                status,
+                self.revealed,
+            )
+        ]
+        packed = dict(self.cold)
+        for key, chunk in self.hot.items():
+            if chunk.touched:
+                packed[key] = codec.pack_bits(chunk.visible) + codec.pack_bits(
+                    chunk.flags
+                )
+        for key, bits in packed.items():
+            parts.append(CHUNK_KEY.pack(*key))
+            parts.append(bits)
+        return b"".join(parts)
+
+    @classmethod
+    def loads(cls, blob, **kwargs):
+        """bytes made by dumps -> the game. chunks stay packed until they're used"""
+        if blob[0] != VERSION:
+            raise ValueError(f"unknown infinite board version {blob[0]}")
+        _, seed, density, size, start_row, start_col, status, revealed = (
+            HEADER.unpack_from(blob)
+        )
+        board = cls(seed, density, size, **kwargs)
+        if status & STARTED:
+            board.start = (start_row, start_col)
+        board.game_over = bool(status & GAME_OVER)
+        board.revealed = revealed
+        width = (size * size + 7) // 8 * 2
+        for pos in range(HEADER.size, len(blob), CHUNK_KEY.size + width):
+            key = CHUNK_KEY.unpack_from(blob, pos)
+            start = pos + CHUNK_KEY.size
+            board.cold[key] = blob[start : start + width]
+        return board
+
+    def stats(self):
+        return {
+            "hot": len(self.hot),
+            "cold": len(self.cold),
+            "cold_bytes": sum(len(bits) for bits in self.cold.values()),
+            "revealed": self.revealed,
+        }
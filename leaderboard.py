@@ -0,0 +1,179 @@
+"""
+Fastest wins for each board size and mine count, kept in SQLite.
+
+Wins are queued and written in batches by a background thread, so a
+winning move never waits on the disk. Reads are served from memory: the
+top few of each board recently asked about are kept in a heap, and a new
+win is pushed into it as it's recorded. Only the first look at a board
+reads the database, down its (rows, cols, mines, ms) index, and wins still
+waiting to be written are added to what it finds, so a read never waits
+on the writer.
+
+    board = Leaderboard("leaderboard.db")
+    board.record(16, 16, 20, 41250)
+    board.top(16, 16, 20, limit=10)
+"""
+
+import heapq
+import queue
+import threading
+from collections import OrderedDict, defaultdict, deque
+from time import time
+
+from database import Database
+
+
+class Leaderboard(object):
+    def __init__(self, path="leaderboard.db", top=100, boards=256, batch=256, wait=1.0):
+        self.path = path
+        self.keep = top  # wins per board held in memory
+        self.boards = boards  # boards held in memory
+        self.batch = batch  # most wins written in one transaction
+        self.wait = wait  # seconds the writer waits to fill a batch
+        self.cache = OrderedDict()  # (rows, cols, mines) -> heap of (-ms, -won_at)
+        self.ranked = {}  # (rows, cols, mines) -> the heap sorted, fastest first
+        self.queue = queue.Queue()
+        self.unwritten = defaultdict(deque)  # (rows, cols, mines) -> wins not written
+        self.writer = None
+        self.written = 0
+        self.batches = 0
+        self.hits = 0
+        self.misses = 0
+        self.database = Database(
+            path,
+            "CREATE TABLE IF NOT EXISTS wins ("
+            " rows INTEGER NOT NULL,"
+            " cols INTEGER NOT NULL,"
+            " mines INTEGER NOT NULL,"
+            " ms INTEGER NOT NULL,"
+            " won_at REAL NOT NULL)",
+            # covers the top-k query, so it never reads the table itself
+            "CREATE INDEX IF NOT EXISTS wins_board"
+            " ON wins (rows, cols, mines, ms, won_at)",
+        )
+        self._unwritten_mutex = threading.Lock()
+
+    def execute(self, sql, *args):
+        return self.database.execute(sql, *args)
+
+    def record(self, rows, cols, mines, ms, won_at=None):
+        """a win that took ms milliseconds. returns straight away"""
+        won_at = time() if won_at is None else won_at
+        key = (rows, cols, mines)
+        if key in self.cache:
+            self.push(key, ms, won_at)
+        with self._unwritten_mutex:
+            self.unwritten[key].append((ms, won_at))
+        self.queue.put((rows, cols, mines, ms, won_at))
+        if self.writer is None or not self.writer.is_alive():
+            self.writer = threading.Thread(
+                target=self.write, name="leaderboard", daemon=True
+            )
+            self.writer.start()
+
+    def push(self, key, ms, won_at):
+        """into a cached board's heap, if it's fast enough"""
+        heap = self.cache[key]
+        entry = (-ms, -won_at)
+        if len(heap) < self.keep:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+        else:
+            return
+        self.ranked.pop(key, None)
+
+    def write(self):
+        """the writer thread. batches whatever is queued into one transaction"""
+        while True:
+            wins = [self.queue.get()]
+            try:
+                while len(wins) < self.batch:
+                    wins.append(self.queue.get(timeout=self.wait))
+            except queue.Empty:
+                pass
+            try:
+                with self.database.mutex:
+                    db = self.database.db
+                    db.execute("BEGIN")
+                    db.executemany(
+                        "INSERT INTO wins (rows, cols, mines, ms, won_at)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        wins,
+                    )
+                    db.execute("COMMIT")
+                    # still under the mutex, so a read sees each win just once
+                    with self._unwritten_mutex:
+                        for rows, cols, mines, _, _ in wins:
+                            key = (rows, cols, mines)
+                            self.unwritten[key].popleft()
+                            if not self.unwritten[key]:
+                                del self.unwritten[key]
+                self.written += len(wins)
+                self.batches += 1
+            finally:
+                for _ in wins:
+                    self.queue.task_done()
+
+    def flush(self):
+        """wait for everything recorded so far to be written"""
+        if self.writer is not None and self.writer.is_alive():
+            self.queue.join()
+
+    def close(self):
+        self.flush()
+
+    def fastest(self, key, n):
+        """a board's n fastest wins, written or still queued, fastest first"""
+        with self.database.mutex:
+            found = self.database.db.execute(
+                "SELECT ms, won_at FROM wins WHERE rows = ? AND cols = ? AND mines = ?"
+                " ORDER BY ms, won_at LIMIT ?",
+                (*key, n),
+            ).fetchall()
+            with self._unwritten_mutex:
+                queued = list(self.unwritten.get(key, ()))
+        if not queued:
+            return found
+        return sorted(found + queued)[:n]
+
+    def load(self, key):
+        """a board's top wins, from the database"""
+        heap = [(-ms, -won_at) for ms, won_at in self.fastest(key, self.keep)]
+        heapq.heapify(heap)
+        self.cache[key] = heap
+        while len(self.cache) > self.boards:
+            dropped, _ = self.cache.popitem(last=False)
+            self.ranked.pop(dropped, None)
+        return heap
+
+    def top(self, rows, cols, mines, limit=10, offset=0):
+        """the fastest wins on a board -> [(ms, won_at), ...], fastest first"""
+        key = (rows, cols, mines)
+        if offset + limit > self.keep:
+            # past what's kept in memory
+            return self.fastest(key, offset + limit)[offset:]
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        else:
+            self.misses += 1
+            self.load(key)
+        ranked = self.ranked.get(key)
+        if ranked is None:
+            ranked = self.ranked[key] = [
+                (-ms, -won_at) for ms, won_at in sorted(self.cache[key], reverse=True)
+            ]
+        return ranked[offset : offset + limit]
+
+    def stats(self):
+        looked = self.hits + self.misses
+        return {
+            "boards": len(self.cache),
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / looked if looked else 0.0,
+        }
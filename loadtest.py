@@ -0,0 +1,325 @@
+"""
+End-to-end load test for the app over loopback.
+
+Starts minesweeper:app (in a subprocess by default, or in this process) and
+runs many simulated players at once. Each one follows the real cookie flow
+through /, /size, /density, /move, /flag and /reset. Reports throughput and
+p50/p95/p99 latency per endpoint, and samples the server's RSS as it goes.
+
+    python loadtest.py --players 50 --duration 30
+    python loadtest.py --inprocess --players 10 --duration 10
+    python loadtest.py --url http://127.0.0.1:9000 --pid 1234
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+SESSION_COOKIES = ("session_id", "session")  # the server store's, and a sealed one
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_bytes(pid):
+    """resident memory of a process, from /proc where there is one"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if pid == os.getpid():
+        # ru_maxrss is the peak, in KiB on linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return None
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Player(object):
+    """one browser: a keep-alive connection and a session cookie"""
+
+    def __init__(self, host, port, latencies, size, density):
+        self.host = host
+        self.port = port
+        self.latencies = latencies
+        self.size = size
+        self.density = density
+        self.cookies = {}  # session_id, or session in cookie session mode
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path):
+        """GET path and return (status, body). records the latency against the endpoint"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+
+        headers = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        if self.cookies:
+            headers.append(
+                "Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+            )
+        start = time.perf_counter()
+        self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode())
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        chunked = False
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            name = name.lower()
+            value = value.strip()
+            if name == "content-length":
+                length = int(value)
+            elif name == "transfer-encoding":
+                chunked = "chunked" in value
+            elif name == "set-cookie":
+                cookie, _, cookie_value = value.split(";")[0].partition("=")
+                if cookie in SESSION_COOKIES:
+                    cookie_value = cookie_value.strip('"')
+                    if cookie_value:
+                        self.cookies[cookie] = cookie_value
+                    else:
+                        self.cookies.pop(cookie, None)
+
+        if chunked:
+            body = b""
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+        else:
+            body = await self.reader.readexactly(length)
+
+        endpoint = path.split("?")[0]
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        return status, body
+
+    async def play_game(self, rng):
+        await self.get("/")
+        if self.size:
+            await self.get(f"/size?value={self.size}")
+        size = self.size or 12
+        await self.get(f"/density?value={self.density or rng.randint(20, 100)}")
+
+        for _ in range(size * size):
+            tile = f"tileR{rng.randrange(size)}C{rng.randrange(size)}"
+            if rng.random() < 0.1:
+                status, body = await self.get(f"/flag?diff=1&tile={tile}")
+            else:
+                status, body = await self.get(f"/move?diff=1&tile={tile}")
+            if status != 200 or json.loads(body)["game_over"]:
+                break
+
+        await self.get("/reset")
+
+    async def run(self, deadline, seed):
+        rng = random.Random(seed)
+        games = 0
+        try:
+            while time.monotonic() < deadline:
+                await self.play_game(rng)
+                games += 1
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+        return games
+
+
+async def sample_rss(pid, samples, interval, stop):
+    start = time.monotonic()
+    while not stop.is_set():
+        rss = rss_bytes(pid)
+        if rss is not None:
+            samples.append((round(time.monotonic() - start, 2), rss))
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(host, port, pid, args):
+    latencies = defaultdict(list)
+    rss = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(pid, rss, args.sample_interval, stop))
+
+    start = time.monotonic()
+    deadline = start + args.duration
+    players = [
+        Player(host, port, latencies, args.size, args.density)
+        for _ in range(args.players)
+    ]
+    games = await asyncio.gather(
+        *[p.run(deadline, args.seed + n) for n, p in enumerate(players)]
+    )
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    await sampler
+    return latencies, rss, sum(games), elapsed
+
+
+def report(latencies, rss, games, elapsed):
+    total = sum(len(v) for v in latencies.values())
+    result = {
+        "elapsed": elapsed,
+        "games": games,
+        "requests": total,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "endpoints": {},
+        "rss": rss,
+    }
+    print(
+        f"{games} games, {total} requests in {elapsed:.1f}s ({result['throughput']:.1f} req/s)"
+    )
+    print(
+        f"{'endpoint':<10} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for endpoint, times in sorted(latencies.items()):
+        times.sort()
+        stats = {
+            "count": len(times),
+            "throughput": len(times) / elapsed,
+            "p50": percentile(times, 50),
+            "p95": percentile(times, 95),
+            "p99": percentile(times, 99),
+        }
+        result["endpoints"][endpoint] = stats
+        print(
+            f"{endpoint:<10} {stats['count']:>7} {stats['throughput']:>8.1f} "
+            f"{stats['p50']*1000:>8.2f} {stats['p95']*1000:>8.2f} {stats['p99']*1000:>8.2f}"
+        )
+    if rss:
+        print(
+            "server rss MiB: "
+            + " ".join(
+                f"{t:.0f}s={b / 2**20:.1f}" for t, b in rss[:: max(1, len(rss) // 10)]
+            )
+        )
+    return result
+
+
+def start_subprocess(port):
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "minesweeper:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        stdout=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return server
+
+
+def start_inprocess(port):
+    import uvicorn
+
+    config = uvicorn.Config(
+        "minesweeper:app", host="127.0.0.1", port=port, log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    return server
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server didn't start listening on {port}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument(
+        "--size", type=int, help="board size to play on (default: the app's)"
+    )
+    parser.add_argument(
+        "--density", type=int, help="mines per game (default: random 20-100)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument(
+        "--inprocess", action="store_true", help="run the server in this process"
+    )
+    parser.add_argument("--url", help="an already running server on loopback")
+    parser.add_argument("--pid", type=int, help="process to sample RSS from with --url")
+    parser.add_argument("--out", help="write the results here as JSON")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port, pid = parts.hostname, parts.port or 80, args.pid
+    else:
+        host, port = "127.0.0.1", free_port()
+        if args.inprocess:
+            server = start_inprocess(port)
+            pid = os.getpid()
+        else:
+            server = start_subprocess(port)
+            pid = server.pid
+        wait_for_port(port)
+
+    try:
+        latencies, rss, games, elapsed = asyncio.run(run_load(host, port, pid, args))
+    finally:
+        if isinstance(server, subprocess.Popen):
+            server.terminate()
+            server.wait()
+        elif server is not None:
+            server.should_exit = True
+
+    result = report(latencies, rss, games, elapsed)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
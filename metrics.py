@@ -0,0 +1,129 @@
+"""
+Small, dependency free metrics in the Prometheus text format.
+
+Observing is a bisect and two additions, so it's cheap enough for the hot
+path. Gauges, and counters kept by something else, are callbacks read when
+/metrics is scraped.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+# seconds. from well under a millisecond up to a slow domonic render
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram(object):
+    """counts of observations per bucket, for each set of label values"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., sum]
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *labels)
+
+    def samples(self):
+        for labels, series in sorted(self.series.items()):
+            running = 0
+            for bound, count in zip(self.buckets, series):
+                running += count
+                le = _labels(self.labels, labels, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{le} {running}"
+            running += series[len(self.buckets)]
+            le = _labels(self.labels, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{le} {running}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {series[-1]}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {running}"
+
+
+class Counter(object):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}
+
+    def inc(self, *labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.series.items()):
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+
+class Gauge(object):
+    """a value read from read() on each scrape"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def samples(self):
+        yield f"{self.name} {self.read()}"
+
+
+class ReadCounter(Gauge):
+    """a running total kept elsewhere, read from read() on each scrape"""
+
+    kind = "counter"
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def read_counter(self, *args, **kwargs):
+        return self.register(ReadCounter(*args, **kwargs))
+
+    def render(self):
+        """everything in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
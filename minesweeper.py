@@ -1,83 +1,575 @@
+import asyncio
+import hmac
+import logging
+import os
+import secrets
+import sqlite3
 import sys
-import threading
 import uuid
-from dataclasses import asdict, dataclass, field
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from math import floor
-from random import sample
-from time import perf_counter
+from random import Random
+from time import monotonic, perf_counter, time
+from types import SimpleNamespace
 from typing import Any, Dict, Optional
 
 import uvicorn
 from domonic.CDN import *
 from domonic.html import *
 from domonic.terminal import say
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import HTTPConnection
+
+import codec
+import eventlog
+import solver
+from board import Board
+from broadcast import Hub, message
+from database import Database
+from generator import BoardPool
+from infinite import EDGE, InfiniteBoard
+from leaderboard import Leaderboard
+from metrics import Registry
+from profiling import Profiler, ProfilingMiddleware
+from sealed import Sealer, decode, encode
+from sprites import YEAR, CachedStaticFiles, Sprites
+
+SIZE = 12  # how many columns and rows for a new game (between 8 - 32 is best)
+MIN_SIZE = 8  # smallest board a player can pick
+MAX_SIZE = 1000  # biggest board a player can pick
+# boards bigger than this are drawn a window of VIEWPORT x VIEWPORT at a time
+VIEWPORT = 32
+TILE_SIZE = 30  # the pixel size of each grid.
+IMAGE = "images/img2.jpg"  # the cover image
+RENDER_CACHE_SIZE = 4096  # how many rendered tiles to keep
+SPRITES_DIR = "static"  # where the hashed cover, icons and stylesheet are written
+
+SESSION_TTL = 60 * 60  # seconds an unused session lives
+SESSION_MAX = 10000  # most sessions kept before the oldest are evicted
+SESSION_MAX_BYTES = 64 * 1024 * 1024  # rough memory budget for all sessions
+SESSION_SWEEP = 60  # seconds between sweeps for expired sessions
+# seconds a request can hold a shared session before others may take it
+SESSION_LOCK_LEASE = 10
+# requests to these don't need a session, so scrapers don't make one each time
+SESSIONLESS_PATHS = {
+    "/metrics",
+    "/stats",
+    "/profile",
+    "/profile/start",
+    "/profile/collapsed",
+    "/watch",
+    "/spectate",
+    "/join",
+    "/leaderboard",
+}
+SESSIONLESS_PREFIXES = ("/static/", "/images/")  # the mounted static files
+# allow /profile/start to run live requests under the profiler
+PROFILING = os.environ.get("MINESWEEPER_PROFILING") == "1"
+# where sessions live. 'memory', or 'sqlite:///sessions.db' to share them between workers
+SESSION_BACKEND = os.environ.get("MINESWEEPER_SESSIONS", "memory")
+# keep sessions in a signed, encrypted cookie so any worker can serve any click.
+# ones too big for a cookie still go to MINESWEEPER_SESSIONS
+SESSION_COOKIE = os.environ.get("MINESWEEPER_SESSION_COOKIE") == "1"
+SESSION_COOKIE_MAX = 3072  # bigger sealed sessions are kept on the server instead
+# only deal boards the solver can finish from the first click
+NO_GUESS = os.environ.get("MINESWEEPER_NO_GUESS") == "1"
+# no-guess boards kept ready per (size, density, first-click region)
+BOARD_POOL_DEPTH = 2
+BOARD_POOL_WORKERS = 2  # processes making no-guess boards
+BOARD_POOL_REGION = 3  # first-click regions are this many tiles square
+BOARD_POOL_SHAPES = 4  # (size, density)s kept filled, the ones asked for last
+BOARD_POOL_READY = 512  # most no-guess boards kept ready or being made in all
+BOARD_POOL_RETRY = 600  # seconds before a size and density given up on is tried again
+NO_GUESS_MAX_TILES = 64 * 64  # bigger boards than this are dealt the classic way
+BATCH_MAX = 256  # most actions one /batch request can make
+WATCH_QUEUE = 64  # changes a watcher can fall behind by before it's dropped
+WATCH_VIEW = (0, 0)  # watchers see the window of a big board from the top left
+SHARED_MAX = 10000  # most shared games remembered
+# signs shared game ids and session cookies. set it when running several workers
+SECRET = os.environ.get("MINESWEEPER_SECRET", "").encode() or secrets.token_bytes(32)
+# store games as a seed and a log of moves rather than the board. not with NO_GUESS
+EVENT_LOG = os.environ.get("MINESWEEPER_EVENT_LOG") == "1"
+SNAPSHOT_EVERY = 64  # moves between in-memory board snapshots of a logged game
+SNAPSHOT_GAMES = 1024  # logged games to keep a snapshot of
+LEADERBOARD = os.environ.get("MINESWEEPER_LEADERBOARD", "leaderboard.db")
+LEADERBOARD_TOP = 100  # fastest wins of each board kept in memory
+INFINITE_CHUNK = 32  # tiles along each side of an infinite board's chunks
+INFINITE_HOT = 64  # chunks of an infinite board kept unpacked
+INFINITE_DENSITY = 160  # mines per thousand tiles on an infinite board
+# sparser than this and a first click can flood out past max_reveal tiles
+INFINITE_MIN_DENSITY = 140
+INFINITE_VIEW_MAX = 128  # most rows or cols /infinite/view returns
+
+
+log = logging.getLogger("minesweeper")
+
+METRICS = Registry()
+REQUEST_LATENCY = METRICS.histogram(
+    "minesweeper_request_seconds", "Time to handle a request", labels=("endpoint",)
+)
+PHASE_LATENCY = METRICS.histogram(
+    "minesweeper_phase_seconds",
+    "Time spent in each phase of a request",
+    labels=("endpoint", "phase"),
+)
+
+
+def session_size(data: Dict[str, Any]) -> int:
+    """rough bytes held by a session dict"""
+    return sys.getsizeof(data) + sum(
+        sys.getsizeof(k) + sys.getsizeof(v) for k, v in data.items()
+    )
 
-# if your grid SIZE is bigger than 32 you may need to up the recursion limit
-# say(sys.getrecursionlimit())
-# sys.setrecursionlimit(5000)
 
+class SessionStore:
+    """What InMemorySessionMiddleware needs from a session backend"""
 
-SIZE = 12  # how many columns and rows (between 8 - 32 is best)
-TILE_SIZE = 30  # the pixel size of each grid.
-IMAGE = "images/img2.jpg"  # the cover image
+    def create_session(self) -> str:
+        raise NotImplementedError
 
+    def get_session(self, session_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
 
-class InMemorySessionStore:
-    def __init__(self):
-        self.sessions: Dict[str, Dict[str, Any]] = {}
+    def update_session(self, session_id: str, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        """held for the whole of a request on that session"""
+        yield
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions kept in process memory.
+
+    Sessions expire ttl seconds after they were last used, and the least
+    recently used ones are evicted to stay under max_sessions and max_bytes.
+    """
+
+    def __init__(
+        self,
+        ttl: float = SESSION_TTL,
+        max_sessions: int = SESSION_MAX,
+        max_bytes: int = SESSION_MAX_BYTES,
+    ):
+        self.sessions: Dict[str, Dict[str, Any]] = OrderedDict()
+        self.last_used: Dict[str, float] = {}
+        self.sizes: Dict[str, int] = {}
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self.expirations = 0
 
     def create_session(self) -> str:
-        print("creating a sesh")
+        log.debug("creating session")
         session_id = str(uuid.uuid4())
-        self.sessions[session_id] = {}
+        self.update_session(session_id, {})
         return session_id
 
     def get_session(self, session_id: str) -> Dict[str, Any]:
-        print("getting the sesh")
-        return self.sessions.get(session_id, {})
+        log.debug("getting session %s", session_id)
+        if session_id not in self.sessions:
+            return {}
+        if monotonic() - self.last_used[session_id] > self.ttl:
+            self.delete_session(session_id)
+            self.expirations += 1
+            return {}
+        self.last_used[session_id] = monotonic()
+        self.sessions.move_to_end(session_id)
+        return self.sessions[session_id]
 
     def update_session(self, session_id: str, data: Dict[str, Any]) -> None:
+        size = session_size(data)
+        self.bytes += size - self.sizes.get(session_id, 0)
+        self.sizes[session_id] = size
         self.sessions[session_id] = data
+        self.sessions.move_to_end(session_id)
+        self.last_used[session_id] = monotonic()
+        self.evict(keep=session_id)
 
     def delete_session(self, session_id: str) -> None:
         if session_id in self.sessions:
             del self.sessions[session_id]
+            del self.last_used[session_id]
+            self.bytes -= self.sizes.pop(session_id)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """drop least recently used sessions until under the limits"""
+        while len(self.sessions) > 1 and (
+            len(self.sessions) > self.max_sessions or self.bytes > self.max_bytes
+        ):
+            oldest = next(iter(self.sessions))
+            if oldest == keep:
+                break
+            self.delete_session(oldest)
+            self.evictions += 1
+
+    def sweep(self) -> int:
+        """remove expired sessions. returns how many went"""
+        cutoff = monotonic() - self.ttl
+        expired = []
+        # oldest first, so stop at the first one still in date
+        for session_id in self.sessions:
+            if self.last_used[session_id] > cutoff:
+                break
+            expired.append(session_id)
+        for session_id in expired:
+            self.delete_session(session_id)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "bytes": self.bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a SQLite database in WAL mode, shared by every worker process.
+
+    Requests on one session are serialised with a lease on its row, so two
+    workers can't interleave the load and save of the same game.
+    """
+
+    def __init__(
+        self,
+        path: str = "sessions.db",
+        ttl: float = SESSION_TTL,
+        max_sessions: int = SESSION_MAX,
+        lease: float = SESSION_LOCK_LEASE,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.lease = lease
+        self.evictions = 0
+        self.expirations = 0
+        self.database = Database(
+            path,
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " locked_until REAL NOT NULL DEFAULT 0)",
+            "CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)",
+        )
+
+    def execute(self, sql: str, *args) -> sqlite3.Cursor:
+        return self.database.execute(sql, *args)
+
+    def create_session(self) -> str:
+        session_id = str(uuid.uuid4())
+        self.update_session(session_id, {})
+        return session_id
+
+    def get_session(self, session_id: str) -> Dict[str, Any]:
+        row = self.execute(
+            "SELECT data, last_used FROM sessions WHERE id = ?", session_id
+        ).fetchone()
+        if row is None:
+            return {}
+        if time() - row[1] > self.ttl:
+            self.delete_session(session_id)
+            self.expirations += 1
+            return {}
+        try:
+            # json, not pickle. whoever can write the file mustn't get to run code
+            return decode(row[0])
+        except ValueError:
+            return {}
+
+    def update_session(self, session_id: str, data: Dict[str, Any]) -> None:
+        self.execute(
+            "INSERT INTO sessions (id, data, last_used) VALUES (?, ?, ?)"
+            " ON CONFLICT (id) DO UPDATE SET data = excluded.data,"
+            " last_used = excluded.last_used",
+            session_id,
+            encode(data),
+            time(),
+        )
+
+    def delete_session(self, session_id: str) -> None:
+        self.execute("DELETE FROM sessions WHERE id = ?", session_id)
+
+    def sweep(self) -> int:
+        """remove expired sessions, then the least recently used past max_sessions"""
+        expired = self.execute(
+            "DELETE FROM sessions WHERE last_used < ?", time() - self.ttl
+        ).rowcount
+        evicted = self.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            " SELECT id FROM sessions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            self.max_sessions,
+        ).rowcount
+        self.expirations += expired
+        self.evictions += evicted
+        return expired + evicted
+
+    def stats(self) -> Dict[str, Any]:
+        count, size = self.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions"
+        ).fetchone()
+        return {
+            "sessions": count,
+            "bytes": size,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    @asynccontextmanager
+    async def lock(self, session_id: str):
+        """take the lease on the session's row, waiting for any other holder"""
+        while True:
+            now = time()
+            taken = self.execute(
+                "UPDATE sessions SET locked_until = ? WHERE id = ? AND locked_until < ?",
+                now + self.lease,
+                session_id,
+                now,
+            ).rowcount
+            if taken:
+                break
+            exists = self.execute(
+                "SELECT 1 FROM sessions WHERE id = ?", session_id
+            ).fetchone()
+            if exists is None:
+                # nothing to protect. the request will start a new session
+                yield
+                return
+            await asyncio.sleep(0.005)
+        try:
+            yield
+        finally:
+            self.execute(
+                "UPDATE sessions SET locked_until = 0 WHERE id = ?", session_id
+            )
+
+
+def make_session_store(backend: str) -> SessionStore:
+    """'memory' or 'sqlite:///path/to/sessions.db'"""
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend.startswith("sqlite:///"):
+        return SqliteSessionStore(backend[len("sqlite:///") :] or "sessions.db")
+    raise ValueError(f"unknown session backend {backend!r}")
+
+
+def sessionless(path):
+    return path in SESSIONLESS_PATHS or path.startswith(SESSIONLESS_PREFIXES)
 
 
 class InMemorySessionMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, store: InMemorySessionStore):
+    def __init__(self, app, store: SessionStore):
         super().__init__(app)
         self.store = store
 
     async def dispatch(self, request: Request, call_next):
-        print("I DISPATCHED")
+        start = perf_counter()
+        if sessionless(request.url.path):
+            return await call_next(request)
+
         session_id = request.cookies.get("session_id")
-        print(session_id)
+        log.debug("dispatch %s session %s", request.url.path, session_id)
+
+        async with self.store.lock(session_id or ""):
+            with PHASE_LATENCY.time("*", "session_load"):
+                session = self.store.get_session(session_id) if session_id else {}
+                if not session:
+                    # only made if the request puts something in it
+                    session_id = None
+
+            request.state.session = session
+            request.state.session_id = session_id
+            response = await call_next(request)
+
+            session_id = request.state.session_id
+            if session_id is None and request.state.session:
+                session_id = self.store.create_session()
+            if session_id is not None:
+                with PHASE_LATENCY.time("*", "session_save"):
+                    self.store.update_session(session_id, request.state.session)
+
+        if session_id is not None:
+            response.set_cookie(key="session_id", value=session_id, httponly=True)
+
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            perf_counter() - start, route.path if route else "unmatched"
+        )
+        return response
 
-        if session_id is None or not self.store.get_session(session_id):
-            session_id = self.store.create_session()
 
-        request.state.session = self.store.get_session(session_id)
-        response = await call_next(request)
+class SignedCookieSessionMiddleware:
+    """Sessions sealed into a signed, encrypted cookie rather than kept on the server.
 
-        self.store.update_session(session_id, request.state.session)
-        response.set_cookie(key="session_id", value=session_id, httponly=True)
+    Plain ASGI, so there's no task or extra response wrapping per request.
+    A session too big for a cookie is moved to the store and the cookie
+    then only holds its id, so big boards still work. Those sessions are
+    locked like InMemorySessionMiddleware's. request.state.session_id is
+    None for a session in the cookie. set it to keep the session on the server.
+    """
+
+    cookie = "session"
+
+    def __init__(self, app, store: SessionStore, sealer: Sealer, max_bytes: int):
+        self.app = app
+        self.store = store
+        self.sealer = sealer
+        self.max_bytes = max_bytes
+
+    def load(self, cookies) -> tuple:
+        """-> (session, session id or None, the encoded session from the cookie)"""
+        plain = self.sealer.unseal(cookies.get(self.cookie, ""))
+        if plain is None:
+            return {}, None, None
+        session = decode(plain)
+        session_id = session.get("_id")
+        if session_id is None:
+            return session, None, plain
+        return self.store.get_session(session_id) or {}, session_id, plain
+
+    def header(self, state: dict, loaded) -> Optional[bytes]:
+        """the Set-Cookie for the session as the request left it, if it changed"""
+        session_id = state.get("session_id")
+        if session_id is None:
+            if loaded is None and not state["session"]:
+                # nothing was put in a new session, so there's nothing to keep
+                return None
+            plain = encode(state["session"])
+            if plain == loaded:
+                return None
+            token = self.sealer.seal(plain)
+            if len(token) <= self.max_bytes:
+                return self.set_cookie(token)
+            # too big to carry around. keep it here instead
+            session_id = state["session_id"] = self.store.create_session()
+            self.store.update_session(session_id, state["session"])
+        plain = encode({"_id": session_id})
+        if plain == loaded:
+            return None
+        return self.set_cookie(self.sealer.seal(plain))
+
+    def set_cookie(self, token: str) -> bytes:
+        return f"{self.cookie}={token}; HttpOnly; Path=/; SameSite=lax".encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or sessionless(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        with PHASE_LATENCY.time("*", "session_load"):
+            session, session_id, loaded = self.load(HTTPConnection(scope).cookies)
+        state = scope.setdefault("state", {})
+        state["session"] = session
+        state["session_id"] = session_id
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start":
+                cookie = self.header(state, loaded)
+                if cookie is not None:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"set-cookie", cookie)
+                    ]
+            await send(message)
+
+        if session_id is None:
+            await self.app(scope, receive, send_with_cookie)
+        else:
+            async with self.store.lock(session_id):
+                await self.app(scope, receive, send_with_cookie)
+        if state.get("session_id") is not None:
+            with PHASE_LATENCY.time("*", "session_save"):
+                self.store.update_session(state["session_id"], state["session"])
+
+        route = scope.get("route")
+        REQUEST_LATENCY.observe(
+            perf_counter() - start, route.path if route else "unmatched"
+        )
 
-        return response
 
+async def sweep_sessions():
+    """expire old sessions in the background"""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP)
+        session_store.sweep()
 
-app = FastAPI()
-app.mount("/images", StaticFiles(directory="images"), name="images")
+
+@asynccontextmanager
+async def lifespan(app):
+    sweeper = asyncio.create_task(sweep_sessions())
+    if NO_GUESS:
+        board_pool.prepare(SIZE, SIZE, GameData.mine_count)
+    yield
+    sweeper.cancel()
+    board_pool.close()
+    leaderboard.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.mount("/images", CachedStaticFiles(directory="images"), name="images")
 
 # Initialize the session store
-session_store = InMemorySessionStore()
+session_store = make_session_store(SESSION_BACKEND)
+
+session_sealer = Sealer(SECRET, ttl=SESSION_TTL) if SESSION_COOKIE else None
+
+if SESSION_COOKIE:
+    if "MINESWEEPER_SECRET" not in os.environ:
+        log.warning("without MINESWEEPER_SECRET session cookies only work here")
+    app.add_middleware(
+        SignedCookieSessionMiddleware,
+        store=session_store,
+        sealer=session_sealer,
+        max_bytes=SESSION_COOKIE_MAX,
+    )
+else:
+    # Add the in-memory session middleware
+    app.add_middleware(InMemorySessionMiddleware, store=session_store)
 
-# Add the in-memory session middleware
-app.add_middleware(InMemorySessionMiddleware, store=session_store)
+snapshots = eventlog.Snapshots(SNAPSHOT_GAMES)
+
+leaderboard = Leaderboard(LEADERBOARD, top=LEADERBOARD_TOP)
+
+board_pool = BoardPool(
+    depth=BOARD_POOL_DEPTH,
+    workers=BOARD_POOL_WORKERS,
+    region=BOARD_POOL_REGION,
+    max_tiles=NO_GUESS_MAX_TILES,
+    shapes=BOARD_POOL_SHAPES,
+    max_ready=BOARD_POOL_READY,
+    retry=BOARD_POOL_RETRY,
+)
+
+profiler = Profiler()
+if PROFILING:
+    # outermost, so the session load and save are profiled too
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
 
 
 ASSETS = {
@@ -86,6 +578,20 @@ ASSETS = {
     "flag": "images/icons/flag.png",
 }
 
+sprites = Sprites(SPRITES_DIR).build(
+    IMAGE,
+    {**ASSETS, **{f"n{n}": f"images/numbers/{n}.png" for n in range(1, 9)}},
+    TILE_SIZE,
+    SIZE,
+    MAX_SIZE,
+)
+# the names have a hash of what's in them, so they can be kept for good
+app.mount(
+    "/static",
+    CachedStaticFiles(directory=SPRITES_DIR, max_age=YEAR, immutable=True),
+    name="static",
+)
+
 
 class Clock(tag):
     def __str__(self):
@@ -102,14 +608,20 @@ class Clock(tag):
 
 @dataclass
 class GameData:
+    rows: int = SIZE
+    cols: int = SIZE
     flag_count: int = 0
     mine_count: int = 20
     game_over: bool = False
     game_started: bool = False
-    game_timer_start: int = 0
-    mine_tiles: list = field(default_factory=list)
-    tiles_checked: list = field(default_factory=list)
-    grid: list = field(default_factory=list)
+    game_timer_start: int = 0  # ms since the epoch, at the first click
+    may_guess: bool = False  # no-guess boards are on, but this one wasn't one
+    unranked: bool = False  # started in a session cookie, so kept off the leaderboard
+    seed: int = 0
+    mines: bytes = b""
+    visible: bytes = b""
+    flags: bytes = b""
+    counts: bytes = b""
 
 
 class Game(object):
@@ -124,35 +636,171 @@ class Game(object):
             }
         });
 
-        $( document ).ready(function() {
-            $('.tile').on('click', function() {
-                $.get('/move?tile='+$(this).attr('id'), function(response){
-                    $("#gameboard").html($(response).html());
+        // moves go over the websocket when it's open, otherwise plain http
+        var channel = null;
+
+        function open_channel(){
+            if (!window.WebSocket || channel) return;
+            var proto = location.protocol === "https:" ? "wss://" : "ws://";
+            channel = new WebSocket(proto + location.host + "/ws");
+            channel.onmessage = function(evt){
+                var patch = JSON.parse(evt.data);
+                if (!patch.error) apply_patch(patch);
+            };
+            channel.onclose = function(){ channel = null; };
+        };
+
+        // over http, one request at a time. a session kept in a cookie is
+        // whatever the last response set, so overlapping clicks lose moves
+        var in_flight = $.when();
+        function one_at_a_time(send){
+            in_flight = in_flight.then(send, send);
+        };
+
+        function send_action(message, url){
+            if (channel && channel.readyState === WebSocket.OPEN) {
+                channel.send(JSON.stringify(message));
+            } else if (url) {
+                one_at_a_time(function(){ return $.getJSON(url, apply_patch); });
+            } else {
+                post_actions([message], message.view);
+            }
+        };
+
+        // several actions in one request. see /batch
+        function post_actions(actions, view){
+            one_at_a_time(function(){
+                return $.ajax({
+                    url: '/batch',
+                    type: 'POST',
+                    contentType: 'application/json',
+                    data: JSON.stringify({actions: actions, view: view}),
+                    dataType: 'json',
+                    success: apply_patch
                 });
             });
-            $( ".tile" ).contextmenu(function(e) {
-                e.preventDefault();
-                $.get('/flag?tile='+$(this).attr('id'), function(response){
-                    $("#gameboard").html($(response).html());
+        };
+
+        // changes anyone makes to a shared game, as they happen. see /watch
+        var watching = null;
+
+        function watch_game(game){
+            if (!game || !window.EventSource || watching) return;
+            var drawn = false;
+            watching = new EventSource('/watch?game=' + game);
+            watching.addEventListener("patch", function(evt){
+                apply_patch(JSON.parse(evt.data));
+            });
+            watching.addEventListener("board", function(evt){
+                // sent first. a second one means changes were missed
+                if (drawn) location.reload();
+                drawn = true;
+            });
+        };
+
+        function share_game(){
+            $.getJSON('/share', function(shared){
+                $("#gameboard").attr("data-game", shared.game);
+                watch_game(shared.game);
+                window.prompt(
+                    "Watch: " + location.origin + shared.watch + "\nPlay along:",
+                    location.origin + shared.join
+                );
+            });
+        };
+
+        // big boards only draw the window scrolled to. see Game.render_board
+        var view_timer = null;
+
+        function current_view(){
+            var viewport = $("#viewport");
+            if (!viewport.length) return null;
+            var size = viewport.data("tile");
+            return [
+                Math.floor(viewport.scrollTop() / size),
+                Math.floor(viewport.scrollLeft() / size)
+            ];
+        };
+
+        function view_param(){
+            var view = current_view();
+            return view ? '&view=' + view.join(',') : '';
+        };
+
+        function load_view(){
+            var view = current_view();
+            $.getJSON('/view?view=' + view.join(','), function(window){
+                var size = $("#viewport").data("tile");
+                $("#tiles").html(window.html).css({
+                    top: window.row * size,
+                    left: window.col * size,
+                    width: window.cols * size
                 });
             });
+        };
+
+        // swap in just the tiles that changed. see Game.patch
+        function apply_patch(patch){
+            $.each(patch.cells, function(_, cell){
+                $("#" + cell[0]).replaceWith(cell[1]);
+            });
+            $("#bomb_count").html(patch.counter);
+            $("#face h2").html(patch.face);
+        };
+
+        $( document ).ready(function() {
+            // delegated so replaced tiles don't need re-binding
+            $(document).off(".minesweeper");
+            $(document).on("click.minesweeper", ".tile", function() {
+                var tile = $(this).attr('id');
+                send_action(
+                    {action: "move", tile: tile, view: current_view()},
+                    '/move?diff=1&tile=' + tile + view_param()
+                );
+            });
+            $(document).on("contextmenu.minesweeper", ".tile", function(e) {
+                e.preventDefault();
+                var tile = $(this).attr('id');
+                send_action(
+                    {action: "flag", tile: tile, view: current_view()},
+                    '/flag?diff=1&tile=' + tile + view_param()
+                );
+            });
+            $(document).on("dblclick.minesweeper", ".tile", function() {
+                send_action(
+                    {action: "chord", tile: $(this).attr('id'), view: current_view()}
+                );
+            });
+            $("#viewport").on("scroll", function() {
+                clearTimeout(view_timer);
+                view_timer = setTimeout(load_view, 100);
+            });
+            open_channel();
+            watch_game($("#gameboard").data("game"));
         });
+        function change_size(evt){
+            $.get('/size?value='+$("#gridSize").val(), function(response){
+                location.reload();
+            });
+        };
         function change_density(evt){
-            $.get('/density?value='+$("#myRange").val(), function(response){
-                $("#myRange").html(response);
-                // update the bombcount to reflect the game settings
-                $("#bomb_count").html( $("#myRange").val() )
+            one_at_a_time(function(){
+                return $.get('/density?value='+$("#myRange").val(), function(response){
+                    $("#myRange").html(response);
+                    // update the bombcount to reflect the game settings
+                    $("#bomb_count").html( $("#myRange").val() )
+                });
             });
         };
         """
     )
 
     # create a template so can use in requests... see /density
-    density_tmpl = lambda val: div(
+    density_tmpl = lambda val, most=100: div(
         input(
             _type="range",
-            _min="20",
-            _max="100",
+            # domonic drops _min and _max
+            **{"min": "20", "max": str(min(100, most))},
             _value=val,
             _class="slider",
             _id="myRange",
@@ -163,24 +811,54 @@ class Game(object):
         _ontouchend="change_density()",
     )
 
+    size_tmpl = lambda val: input(
+        _type="number",
+        **{"min": str(MIN_SIZE), "max": str(MAX_SIZE)},
+        _value=val,
+        _id="gridSize",
+        _onchange="change_size()",
+        _style="width:100%;",
+    )
+
     def __init__(self, request=None):
         self.state = GameData()
+        self.moves = array("I")  # the game so far, when it's kept as a log
+        self.snapshot_at = 0
+        self.replaying = False
+        self.changed = {}  # tiles touched by this request, in order
+        # a session in a cookie can be swapped for an older copy of itself
+        self.in_cookie = (
+            SESSION_COOKIE
+            and request is not None
+            and getattr(request.state, "session_id", "") is None
+        )
+        moves = None
         if request is not None:
-            if not request.state.session.get("game"):
-                request.state.session["game"] = asdict(self.state)
+            blob = request.state.session.get("game")
+            if not blob:
+                if EVENT_LOG:
+                    # not the global Mersenne Twister. /log hands seeds out,
+                    # and enough of its outputs give away the next ones
+                    self.state.seed = secrets.randbits(63)
+                request.state.session["game"] = self.dumps()
+            elif eventlog.is_log(blob):
+                moves = eventlog.loads(blob, self.state)
             else:
-                data = request.state.session.get("game")
-                self.state.flag_count = data["flag_count"]
-                self.state.mine_count = data["mine_count"]
-                self.state.game_over = data["game_over"]
-                self.state.game_started = data["game_started"]
-                self.state.game_timer_start = data["game_timer_start"]
-                self.state.mine_tiles = data["mine_tiles"]
-                self.state.tiles_checked = data["tiles_checked"]
-                self.state.grid = data["grid"]
-
-        self.tiles = []
-        self.mine_counter_txt = f"{self.state.mine_count:0>3}"
+                codec.loads(blob, self.state)
+
+        if moves is not None:
+            self.replay(moves)
+        else:
+            self.board = Board(
+                self.state.rows,
+                self.state.cols,
+                self.state.mines,
+                self.state.visible,
+                self.state.flags,
+                self.state.counts,
+            )
+
+        self.mine_counter_txt = self.counter
 
         instructions = [
             h1("💥 Minesweeper 💥"),
@@ -202,17 +880,21 @@ class Game(object):
                 ),
             ),
             a(i("START AGAIN"), _href="/reset"),
+            " ",
+            a(i("SHARE"), _href="#", _onclick="share_game(); return false;"),
             # details(
             #     summary("Settings"),
             #     b("Grid Size:", input(_type="range", _min="0", _max="32", _value="16", _class="slider", _id="myRange") ),
             #     b("Background image:", select(_type="text"))
             # ),
             h3("💣  Difficulty", div(self.mine_counter_txt, _id="bomb_count")),
-            Game.density_tmpl(self.state.mine_count),
+            Game.density_tmpl(self.state.mine_count, self.most_mines()),
+            h3("📐 Grid Size"),
+            Game.size_tmpl(self.state.rows),
             h2("⏱️", Clock()),
             p("Click anywhere on the image to begin:"),
             div(
-                h2("🙂" if not self.state.game_over else "😞"),
+                h2(self.face),
                 _id="face",
                 **{"_aria-label": "I'm not going to help you!"},
                 **{"_data-balloon-pos": "down"},
@@ -222,222 +904,420 @@ class Game(object):
         self.heading = header(*instructions)
         self.cover = IMAGE
         self.grid = []
-        if len(self.state.grid) < 1:
-            self.init_tiles()
-        else:
-            self.load_tiles_from_session()
+        self.shared_as = None  # its public id, once it's been shared. see /share
+
+    def replay(self, moves):
+        """rebuild the board of a logged game from its latest snapshot, or its seed"""
+        snapshot = snapshots.get(self.state.seed, len(moves))
+        if snapshot is not None:
+            self.snapshot_at, blob = snapshot
+            codec.loads(blob, self.state)
+        self.board = Board(
+            self.state.rows,
+            self.state.cols,
+            self.state.mines,
+            self.state.visible,
+            self.state.flags,
+            self.state.counts,
+        )
 
-        self.tile_lookup = {}
-        for t in self.flatten():
-            self.tile_lookup[t._id] = t
+        self.replaying = True
+        for move in moves[self.snapshot_at :]:
+            action, i = eventlog.decode(move)
+            if action == eventlog.FLAG:
+                self.toggle_flag(i)
+            elif action == eventlog.CHORD:
+                self.chord(i)
+            else:
+                self.move(i)
+            self.check_winner()
+        self.replaying = False
+
+        self.moves = moves
+        self.changed = {}
+        self.update_tiles_state()
+
+    def record(self, action, tile):
+        """add a move to the log of a logged game"""
+        if EVENT_LOG and not self.replaying and not self.state.game_over:
+            self.moves.append(eventlog.encode(action, self.tile_index(tile)))
+
+    def dumps(self):
+        """the game as it's kept in the session"""
+        if not EVENT_LOG:
+            return codec.dumps(self.state)
+        if len(self.moves) >= self.snapshot_at + SNAPSHOT_EVERY:
+            self.update_tiles_state()
+            self.snapshot_at = len(self.moves)
+            snapshots.put(self.state.seed, self.snapshot_at, codec.dumps(self.state))
+        return eventlog.dumps(self.state, self.moves)
+
+    @property
+    def counter(self):
+        """mines left to flag"""
+        return f"{self.state.mine_count - self.state.flag_count:0>3}"
 
-    def flatten(self):
-        return [tile for row in self.tiles for tile in row]
+    @property
+    def face(self):
+        if self.state.game_over:
+            return "😞"
+        # no-guess boards are on, but this one might need a guess
+        return "🤔" if self.state.may_guess else "🙂"
+
+    def tile_index(self, tile):
+        """'tileR3C4' -> index on the board"""
+        if isinstance(tile, int):
+            if not 0 <= tile < self.board.n:
+                raise KeyError(tile)
+            return tile
+        if not isinstance(tile, str):
+            raise KeyError(tile)
+        try:
+            row, col = (int(v) for v in tile[len("tileR") :].split("C"))
+        except ValueError:
+            raise KeyError(tile)
+        if not (0 <= row < self.board.rows and 0 <= col < self.board.cols):
+            raise KeyError(tile)
+        return self.board.index(row, col)
+
+    def tile_image(self, i):
+        """the image a tile shows in its current state"""
+        board = self.board
+        if not board.visible[i]:
+            return self.cover
+        if board.mines[i]:
+            return ASSETS["bomb"]
+        if board.counts[i] == 0:
+            return ASSETS["clear"]
+        return f"images/numbers/{board.counts[i]}.png"
 
     def update_tiles_state(self):
         """update the gameboard state"""
-        self.state.grid = [[asdict(t) for t in row] for row in self.tiles]
+        self.state.mines = bytes(self.board.mines)
+        self.state.visible = bytes(self.board.visible)
+        self.state.flags = bytes(self.board.flags)
+        self.state.counts = bytes(self.board.counts)
+
+    def tile(self, i):
+        """build the Tile element for one board index"""
+        board = self.board
+        r, c = board.coords(i)
+        data = {
+            "_id": f"tileR{r}C{c}",
+            "image_path": self.tile_image(i),
+            "index": [r, c],
+            "has_mine": bool(board.mines[i]),
+            "is_visible": bool(board.visible[i]),
+            "has_flag": bool(board.flags[i]),
+            "neighbouring_mines": board.counts[i],
+        }
+        return Tile(data["image_path"], r, c, data)
+
+    def tile_state(self, i):
+        """what a tile looks like. with its position this is all its html depends on"""
+        board = self.board
+        if board.flags[i]:
+            return "flag"
+        if not board.visible[i]:
+            return "cover"
+        if board.mines[i]:
+            return "bomb"
+        if board.counts[i] == 0:
+            return "clear"
+        return board.counts[i]
+
+    def render_tile(self, i):
+        """html for one tile, from the render cache where possible"""
+        r, c = self.board.coords(i)
+        key = (self.tile_state(i), r, c)
+        return render_cache.get(key, lambda: str(self.tile(i)))
+
+    def window(self, row=0, col=0):
+        """(row, col, rows, cols) of the window onto the board starting near row, col"""
+        board = self.board
+        rows = min(board.rows, VIEWPORT)
+        cols = min(board.cols, VIEWPORT)
+        row = max(0, min(row, board.rows - rows))
+        col = max(0, min(col, board.cols - cols))
+        return row, col, rows, cols
+
+    def render_tiles(self, row=0, col=0, rows=None, cols=None):
+        """html for each row of the board, or just a window of it. only needed to draw it"""
+        board = self.board
+        rows = board.rows if rows is None else rows
+        cols = board.cols if cols is None else cols
+        self.grid = [
+            "".join(self.render_tile(board.index(r, c)) for c in range(col, col + cols))
+            for r in range(row, row + rows)
+        ]
+        return self.grid
 
-    def load_tiles_from_session(self):
-        """loads a grid from an existing game stored in the session"""
-        self.grid = []
-        self.tiles = []
-        self.flatten()
-        for cc, c in enumerate(self.state.grid):
-            row = []
-            for cr, r in enumerate(c):
-                img = self.cover
-                t = Tile(str(img), cc, cr, r)
-                self.tiles.append(t)
-                row.append(t)
-            self.grid.append(row)
-        # self.tiles = self.tiles.reshape([SIZE, SIZE])
-        self.tiles = [self.tiles[i : i + SIZE] for i in range(0, len(self.tiles), SIZE)]
-
-    def init_tiles(self):
-        """init a tile grid and tile array"""
-        grid_layout = []
-        for r in range(SIZE):
-            row = []
-            drow = []
-            for c in range(SIZE):
-                img = self.cover
-                t = Tile(str(img), r, c)
-                self.tiles.append(t)
-                row.append(t)
-                drow.append(asdict(t))
-            self.grid.append(row)
-            self.state.grid.append(drow)
-        # self.tiles = self.tiles.reshape([SIZE, SIZE])
-        self.tiles = [self.tiles[i : i + SIZE] for i in range(0, len(self.tiles), SIZE)]
+    @property
+    def cover_size(self):
+        """css for the cover image to span this board"""
+        board = self.board
+        return f"--cover-size:{TILE_SIZE*board.cols}px {TILE_SIZE*board.rows}px;"
+
+    @property
+    def shared_data(self):
+        """the attribute that tells the page to follow a shared game"""
+        return {"_data-game": self.shared_as} if self.shared_as else {}
+
+    def render_board(self, row=0, col=0):
+        """the whole gameboard. big boards get a scrolling viewport onto a window"""
+        board = self.board
+        if board.rows <= VIEWPORT and board.cols <= VIEWPORT:
+            self.render_tiles()
+            return main(
+                self.heading,
+                *self.grid,
+                Game.js_code,
+                _id="gameboard",
+                _style=f"width:{TILE_SIZE*board.cols}px;{self.cover_size}",
+                **self.shared_data,
+            )
+
+        row, col, rows, cols = self.window(row, col)
+        self.render_tiles(row, col, rows, cols)
+        tiles = div(
+            *self.grid,
+            _id="tiles",
+            _style=f"position:absolute;top:{row*TILE_SIZE}px;left:{col*TILE_SIZE}px;width:{cols*TILE_SIZE}px;display:flex;flex-wrap:wrap;",
+        )
+        space = div(
+            tiles,
+            _style=f"position:relative;width:{board.cols*TILE_SIZE}px;height:{board.rows*TILE_SIZE}px;",
+        )
+        viewport = div(
+            space,
+            _id="viewport",
+            _style=f"overflow:auto;width:{VIEWPORT*TILE_SIZE}px;height:{VIEWPORT*TILE_SIZE}px;",
+            **{"_data-tile": str(TILE_SIZE)},
+        )
+        return main(
+            self.heading,
+            viewport,
+            Game.js_code,
+            _id="gameboard",
+            _style=f"width:{VIEWPORT*TILE_SIZE + 20}px;{self.cover_size}",
+            **self.shared_data,
+        )
+
+    def patch(self, view=None):
+        """just what this request changed, for the client to apply in place.
+
+        On big boards pass the (row, col) the client is viewing and only tiles
+        in that window are sent. the rest are drawn when scrolled to.
+        """
+        board = self.board
+        changed = self.changed
+        if view is not None:
+            row, col, rows, cols = self.window(*view)
+            if len(changed) > rows * cols:
+                # a big flood. cheaper to look over the window than the changes
+                changed = [
+                    i
+                    for r in range(row, row + rows)
+                    for i in range(board.index(r, col), board.index(r, col + cols))
+                    if i in changed
+                ]
+            else:
+                changed = [
+                    i
+                    for i in changed
+                    if row <= i // board.cols < row + rows
+                    and col <= i % board.cols < col + cols
+                ]
+        return {
+            "cells": [
+                ["tileR%dC%d" % board.coords(i), self.render_tile(i)] for i in changed
+            ],
+            "counter": self.counter,
+            "face": self.face,
+            "game_over": self.state.game_over,
+        }
 
     def create_mines(self, first_tile):
         """Set random tiles as mines"""
-        tiles = list(self.tile_lookup.keys())
-        tiles.remove(first_tile)  # no lose on the first turn.
-        self.state.mine_tiles = sample(tiles, k=self.state.mine_count)
-        for mine in self.flatten():
-            if mine._id in self.state.mine_tiles:
-                mine.has_mine = True
+        first = self.tile_index(first_tile)
+        if EVENT_LOG:
+            # the log only has the seed to go on
+            self.board.place_mines(
+                self.state.mine_count, first, Random(self.state.seed)
+            )
+            return
+        if NO_GUESS:
+            mines = board_pool.take(
+                self.state.rows, self.state.cols, self.state.mine_count, first
+            )
+            if mines is not None:
+                self.board.mines[:] = mines
+                return
+            # none ready, or none to be had. say so rather than pass it off
+            self.state.may_guess = True
+        # no lose on the first turn.
+        self.board.place_mines(self.state.mine_count, first)
+
+    def prepare_mines(self):
+        """get no-guess boards made for this size and density before the first click"""
+        if NO_GUESS and not EVENT_LOG and not self.state.game_started:
+            board_pool.prepare(self.state.rows, self.state.cols, self.state.mine_count)
 
     def find_neighbours(self):
-        """find neighbour tile props"""
-        for tile in self.flatten():
-            neighbours, mines = self.find_neighbouring_tiles(tile)
-            tile.neighbouring_tiles = [n._id for n in neighbours]
-            tile.neighbouring_mines = mines
-
-    # def find_neighbouring_tiles(self, target_tile):
-    #     """Find mine/non-mine neighbours as separate lists"""
-    #     neighbours = []  # 8-squares surrounding the target tile
-    #     offsets = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
-    #     the_index = target_tile.index  # Assume this is a tuple (row, col)
-
-    #     for offset in offsets:
-    #         neighbour_index = (
-    #             the_index[0] + offset[0],
-    #             the_index[1] + offset[1],
-    #         )  # Compute new index
-    #         row, col = neighbour_index
-    #         try:
-    #             if 0 <= row < len(self.tiles) and 0 <= col < len(
-    #                 self.tiles[0]
-    #             ):  # Check bounds
-    #                 neighbours.append(self.tiles[row][col])
-    #         except IndexError:  # Handle out-of-bounds errors
-    #             continue
-
-    #     # Count neighbouring mines
-    #     mines = sum(tile.has_mine for tile in neighbours)
-    #     return neighbours, mines
-
-
-    def find_neighbouring_tiles(self, target_tile):
-        """Find mine/non-mine neighbours as separate lists"""
-        neighbours = []  # 8-squares surrounding the target tile
-        offsets = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
-        the_index = target_tile.index  # Assume this is a tuple (row, col)
-
-        num_rows = len(self.tiles)
-        num_cols = len(self.tiles[0])
-
-        for offset in offsets:
-            row = the_index[0] + offset[0]
-            col = the_index[1] + offset[1]
-
-            if 0 <= row < num_rows and 0 <= col < num_cols:  # Check bounds
-                neighbours.append(self.tiles[row][col])
-
-        # Count neighbouring mines
-        mines = sum(tile.has_mine for tile in neighbours)
-        return neighbours, mines
-
+        """count the mines around every tile"""
+        self.board.count_neighbours()
 
     def update_mine_counter(self):
         """Update the mine counter text"""
         remaining = self.state.mine_count - self.state.flag_count
         self.state.mine_counter_txt = f"{remaining:0>3}"
 
+    def set_board_size(self, value):
+        """Resize an unstarted game to value x value"""
+        size = max(MIN_SIZE, min(MAX_SIZE, int(value)))
+        self.state.rows = self.state.cols = size
+        self.board = Board(size, size)
+        if self.state.mine_count > self.most_mines():
+            # or the first click would win a board that's all mines
+            self.state.mine_count = self.most_mines()
+            self.update_mine_counter()
+        self.update_tiles_state()
+        self.prepare_mines()
+
+    def most_mines(self):
+        """the most mines this size of board takes, leaving room to clear the
+        first click and its neighbours"""
+        return self.state.rows * self.state.cols - 9
+
     def set_mine_density(self, value):
-        """Adjust mine density based on slider"""
-        self.state.mine_count = int(value)
+        """Adjust mine density based on slider. ValueError unless it's a whole
+        number of mines the board has room for"""
+        try:
+            count = int(value)
+        except (TypeError, ValueError):
+            raise ValueError("Density must be a number")
+        most = self.most_mines()
+        if not 1 <= count <= most:
+            raise ValueError(f"Density must be 1 to {most}")
+        self.state.mine_count = count
         self.state.mine_counter_txt = f"{self.state.mine_count:0>3}"
+        self.prepare_mines()
 
     def toggle_flag(self, tile):
         """right-click"""
-        if type(tile) is str:
-            tile = self.tile_lookup[tile]
+        self.record(eventlog.FLAG, tile)
+        i = self.tile_index(tile)
+        board = self.board
 
-        if any([tile.is_visible, self.state.game_over]):
+        if any([board.visible[i], self.state.game_over]):
             return
 
-        if tile.has_flag:
-            tile.has_flag = False
+        self.changed[i] = True
+        if board.flags[i]:
+            board.flags[i] = 0
             self.state.flag_count -= 1
             self.update_mine_counter()
         else:
-            tile.has_flag = True
+            board.flags[i] = 1
             self.state.flag_count += 1
             self.update_mine_counter()
 
     def remove_tiles(self, tile):
-        """on click check tiles"""
-        if type(tile) is str:
-            tile = self.tile_lookup[tile]
-
-        if any(
-            [
-                tile.is_visible,
-                self.state.game_over,
-                tile.has_flag,
-                tile._id in self.state.tiles_checked,
-            ]
-        ):
-            # say('You already clicked that tile!')
-            return
+        """on click check tiles. returns the indexes of the tiles uncovered"""
+        i = self.tile_index(tile)
+
+        if self.state.game_over:
+            return []
 
-        # add to list of checked tiles
-        self.state.tiles_checked.append(tile._id)
+        revealed = self.board.reveal(i)
+        self.uncovered(revealed)
+        return revealed
+
+    def chord(self, tile):
+        """open the unflagged neighbours of a number that has all its flags"""
+        self.record(eventlog.CHORD, tile)
+        i = self.tile_index(tile)
+
+        if self.state.game_over:
+            return []
+
+        revealed = self.board.chord(i)
+        self.uncovered(revealed)
+        return revealed
+
+    def uncovered(self, revealed):
+        """record newly uncovered tiles and end the game if any was a mine"""
+        self.changed.update(dict.fromkeys(revealed, True))
 
         # tile is a mine
-        if tile.has_mine:
+        if any(self.board.mines[i] for i in revealed):
             try:
-                say("You died")
+                if not self.replaying:
+                    say("You died")
             except Exception as e:
-                print("You died")
-            tile.image_path = ASSETS["bomb"]
-            tile.is_visible = True
+                log.info("You died")
             self.state.game_over = True
             self.reveal_mines()
-            return "GameOver"  # TODO - user popup to replay?
-
-        elif tile.neighbouring_mines == 0:
-            tile.image_path = ASSETS["clear"]
-            tile.is_visible = True
-            # check all neighbours
-            # for next_tile in tile.neighbouring_tiles:
-            #     self.remove_tiles(next_tile)
-            # use threading to check neighbours
-            jobs = []
-            for next_tile in tile.neighbouring_tiles:
-                thread = threading.Thread(target=self.remove_tiles(next_tile))
-                thread.setDaemon(True)
-                jobs.append(thread)
-            map(lambda j: j.start(), jobs)
-            map(lambda j: j.join(), jobs)
-
-        else:
-            tile.image_path = f"images/numbers/{tile.neighbouring_mines}.png"
-            tile.is_visible = True
 
     def reveal_mines(self):
         """show mines"""
-        for m in self.state.mine_tiles:
-            mine = self.tile_lookup[m]
-            # TODO - show correct / incorrect guesses
-            # if mine.has_flag:
-            #     mine.image_path = ASSETS['bomb']
-            #     mine.is_visible = True
-            # else:
-            mine.image_path = ASSETS["bomb"]
-            mine.is_visible = True
+        # TODO - show correct / incorrect guesses
+        for m in self.board.mine_indexes():
+            self.board.visible[m] = 1
+            self.changed[m] = True
 
     def start_game(self, tile):
         """starts with first click"""
         self.state.game_started = True
+        if not self.replaying:
+            self.state.game_timer_start = int(time() * 1000)
+        if self.in_cookie:
+            # a tile can be tried, then the cookie from before sent back
+            self.state.unranked = True
         self.create_mines(tile)
         self.find_neighbours()
-        self.remove_tiles(tile)
+        return self.remove_tiles(tile)
+
+    def act(self, action, tile):
+        """a move, flag or chord by name"""
+        self.tile_index(tile)  # a bad tile raises before anything changes
+        if action == "move":
+            self.move(tile)
+        elif action == "flag":
+            self.toggle_flag(tile)
+        elif action == "chord":
+            self.chord(tile)
+        else:
+            raise KeyError(action)
+        self.check_winner()
+
+    def move(self, tile):
+        """left-click. the first one starts the game"""
+        self.record(eventlog.MOVE, tile)
+        if not self.state.game_started:
+            return self.start_game(tile)
+        return self.remove_tiles(tile)
 
     def check_winner(self):
         """if all mines are accounted for and tiles uncovered"""
-        target = (SIZE * SIZE) - self.state.mine_count
-        if not self.state.game_over and len(self.state.tiles_checked) == target:
+        target = self.board.n - self.board.mine_count
+        # mines are only ever uncovered once the game is lost
+        if not self.state.game_over and self.board.visible.count(1) == target:
             self.state.game_over = True
+            ranked = not (self.in_cookie or self.state.unranked)
+            if not self.replaying and self.state.game_timer_start and ranked:
+                # the mines actually placed, not the count asked for
+                leaderboard.record(
+                    self.state.rows,
+                    self.state.cols,
+                    self.board.mine_count,
+                    int(time() * 1000) - self.state.game_timer_start,
+                )
             try:
-                say("You won!")
+                if not self.replaying:
+                    say("You won!")
             except Exception as e:
-                print("You won")
+                log.info("You won")
             return True
         else:
             return False
@@ -452,7 +1332,6 @@ class TileData:
     has_mine: bool = False
     is_visible: bool = False
     has_flag: bool = False
-    neighbouring_tiles: list = field(default_factory=list)
     neighbouring_mines: int = 0  # count of nearby mines
 
 
@@ -462,66 +1341,30 @@ class Tile(button, TileData, object):
     def __init__(self, image, row, col, data=None):
         self._id = f"tileR{row}C{col}"
         self.image_path = image
-
-        if "icons" not in self.image_path and "numbers" not in self.image_path:
-            self.__image_tile = div(
-                _style=f"width:100%;height:100%;background:url({self.image_path}); background-position: -{col*TILE_SIZE}px -{row*TILE_SIZE}px;background-size:{TILE_SIZE*SIZE}px {TILE_SIZE*SIZE}px;"
-            )
-        else:
-            self.__image_tile = div(
-                _style=f"width:100%;height:100%;background:url({self.image_path});background-size:{TILE_SIZE}px {TILE_SIZE}px;"
-            )
-
         self.index = [row, col]
         # self.has_flag = False
-        self.neighbouring_tiles = []  # list of nearby tiles
         self.neighbouring_mines = 0  # count of nearby mines
 
         if data is not None:
             self._id = data["_id"]
             self.image_path = data["image_path"]
-
-            if "icons" not in self.image_path and "numbers" not in self.image_path:
-                self.__image_tile = div(
-                    _style=f"width:100%;height:100%;background:url({self.image_path}); background-position: -{col*TILE_SIZE}px -{row*TILE_SIZE}px;background-size:{TILE_SIZE*SIZE}px {TILE_SIZE*SIZE}px;"
-                )
-            else:
-                self.__image_tile = div(
-                    _style=f"width:100%;height:100%;background:url({self.image_path});background-size:{TILE_SIZE}px {TILE_SIZE}px;"
-                )
-
             self.index = data["index"]
             self.has_mine = data["has_mine"]
             self.is_visible = data["is_visible"]
             self.has_flag = data["has_flag"]
-            self.neighbouring_tiles = data["neighbouring_tiles"]
             self.neighbouring_mines = data["neighbouring_mines"]
 
+        # how it looks is all in the sprites stylesheet
         super().__init__(
-            self.image_tile,
-            _src=self.image_path,
+            self.image_tile(row, col),
             _id=f"tileR{row}C{col}",
             _class="tile",
         )
-        self.style.padding = "0px"
-        self.style.margin = "0px"
-        self.style.border = "none"
-        self.style.borderStyle = "solid"
-        # self.style.borderColor = "black"
-        # self.style.borderWidth = '0.5px'
 
-        self.style.width = str(TILE_SIZE) + "px"
-        self.style.height = str(TILE_SIZE) + "px"
-        self.style.backgroundColor = "white"
-
-    @property
-    def image_tile(self):
+    def image_tile(self, row, col):
         if self.has_flag:
-            return div(
-                _style=f"width:100%;height:100%;background:url({self.image_flag});background-size:{TILE_SIZE}px {TILE_SIZE}px;"
-            )
-        else:
-            return self.__image_tile
+            return div(_class=sprites.classes(self.image_flag, row, col))
+        return div(_class=sprites.classes(self.image_path, row, col))
 
     # def __str__(self):
     # return str(self)
@@ -539,9 +1382,143 @@ class Tile(button, TileData, object):
         return str(self)
 
 
+class TileCache(object):
+    """Bounded LRU of rendered tile html, keyed on (state, row, col).
+
+    Everything is dropped when IMAGE, SIZE or TILE_SIZE change.
+    """
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.fragments = OrderedDict()
+        self.config = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+
+    def clear(self):
+        self.fragments.clear()
+        self.bytes = 0
+
+    def get(self, key, build):
+        config = (IMAGE, SIZE, TILE_SIZE)
+        if config != self.config:
+            self.clear()
+            self.config = config
+
+        html = self.fragments.get(key)
+        if html is not None:
+            self.hits += 1
+            self.fragments.move_to_end(key)
+            return html
+
+        self.misses += 1
+        html = build()
+        self.fragments[key] = html
+        self.bytes += len(html)
+        while len(self.fragments) > self.maxsize:
+            _, old = self.fragments.popitem(last=False)
+            self.bytes -= len(old)
+            self.evictions += 1
+        return html
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.fragments),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": self.bytes,
+        }
+
+
+render_cache = TileCache()
+
+hub = Hub(WATCH_QUEUE)
+shared = OrderedDict()  # public id -> session id of the game being shared
+watch_boards = {}  # public id -> the encoded board new watchers start with
+
+
+def public_id(session_id):
+    """the id a game is shared under. the session id would let anyone take it over"""
+    return hmac.new(SECRET, session_id.encode(), "sha256").hexdigest()[:16]
+
+
+def stored_session_id(cookies):
+    """the id of the session on the server a request's cookies point at, if any"""
+    if not SESSION_COOKIE:
+        return cookies.get("session_id")
+    plain = session_sealer.unseal(cookies.get(SignedCookieSessionMiddleware.cookie, ""))
+    return decode(plain).get("_id") if plain else None
+
+
+def shared_session(game_id):
+    """the session id of a shared game, or a 404"""
+    session_id = shared.get(game_id)
+    if session_id is None or not session_store.get_session(session_id):
+        raise HTTPException(status_code=404, detail="No game shared as that")
+    return session_id
+
+
+def publish_changes(session_id, game):
+    """send what this request changed to whoever's watching the game.
+    rendered and encoded once, however many are watching"""
+    if session_id is None:
+        # in a cookie, so it can't have been shared
+        return
+    game_id = public_id(session_id)
+    if game_id not in shared:
+        return
+    watch_boards.pop(game_id, None)
+    if game.changed and hub.watching(game_id):
+        hub.publish(game_id, "patch", game.patch(WATCH_VIEW))
+
+
+def publish_board(session_id, game):
+    """send the whole board to whoever's watching, after a change a patch
+    can't describe, like a new size or a new game"""
+    if session_id is None:
+        return
+    game_id = public_id(session_id)
+    if game_id not in shared:
+        return
+    watch_boards.pop(game_id, None)
+    if hub.watching(game_id):
+        hub.publish(game_id, "board", board_data(game))
+
+
+def board_data(game):
+    """the window of the board a watcher sees, and the counter and face"""
+    row, col, rows, cols = game.window(*WATCH_VIEW)
+    game.render_tiles(row, col, rows, cols)
+    return {
+        "html": "".join(game.grid),
+        "width": cols * TILE_SIZE,
+        "style": game.cover_size,
+        "counter": game.counter,
+        "face": game.face,
+    }
+
+
+def watched_board(game_id):
+    """the board as it is now, for a watcher to start from. made once per change"""
+    encoded = watch_boards.get(game_id)
+    if encoded is None:
+        session = session_store.get_session(shared[game_id])
+        game = Game(SimpleNamespace(state=SimpleNamespace(session=session)))
+        encoded = watch_boards[game_id] = message("board", board_data(game))
+    return encoded
+
+
 @app.get("/reset")
 async def reset(request: Request):
     request.state.session.pop("game", None)
+    # anyone playing along starts the new game too
+    publish_board(request.state.session_id, Game(request))
     response = RedirectResponse(url="/")
     response.set_cookie(key="session_id", value="", expires=0)
     return response
@@ -552,30 +1529,223 @@ async def density(request: Request):
     game = Game(request)
 
     if game.state.game_started:
-        return HTMLResponse(str(Game.density_tmpl(game.state.mine_count)))
+        return HTMLResponse(
+            str(Game.density_tmpl(game.state.mine_count, game.most_mines()))
+        )
 
     # Extract the 'value' query parameter
     value = request.query_params.get("value")
     if value is None:
         raise HTTPException(status_code=400, detail="Value parameter is missing")
 
-    # try:
-    value = value  # Assuming 'value' should be an integer
-    # except ValueError:
-    # raise HTTPException(status_code=400, detail="Value parameter must be an integer")
+    try:
+        game.set_mine_density(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Store the game data in the session
+    request.state.session["game"] = game.dumps()
+    publish_board(request.state.session_id, game)
+    return HTMLResponse(
+        str(Game.density_tmpl(game.state.mine_count, game.most_mines()))
+    )
 
-    game.set_mine_density(value)
-    request.state.session["game"] = asdict(
-        game.state
-    )  # Store the game data in the session
-    return HTMLResponse(str(Game.density_tmpl(game.state.mine_count)))
+
+@app.get("/size", response_class=HTMLResponse)
+async def size(request: Request):
+    game = Game(request)
+
+    value = request.query_params.get("value")
+    if value is None:
+        raise HTTPException(status_code=400, detail="Value parameter is missing")
+
+    if not game.state.game_started:
+        try:
+            game.set_board_size(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Value must be a number")
+        request.state.session["game"] = game.dumps()
+        publish_board(request.state.session_id, game)
+
+    return HTMLResponse(str(Game.size_tmpl(game.state.rows)))
+
+
+def parse_view(value):
+    """'row,col' from the query string -> (row, col)"""
+    if not value:
+        return None
+    try:
+        row, col = (int(v) for v in value.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="View must be row,col")
+    return row, col
+
+
+def json_view(value):
+    """[row, col] from a JSON message -> (row, col), or None if it's left out"""
+    if value is None:
+        return None
+    if not (
+        isinstance(value, list)
+        and len(value) == 2
+        and all(isinstance(v, int) for v in value)
+    ):
+        raise ValueError("View must be [row, col]")
+    return tuple(value)
+
+
+@app.get("/view")
+async def view(request: Request):
+    """the tiles for the window of a big board starting near view=row,col"""
+    game = Game(request)
+    row, col, rows, cols = game.window(
+        *(parse_view(request.query_params.get("view")) or (0, 0))
+    )
+    game.render_tiles(row, col, rows, cols)
+    return JSONResponse(
+        {"row": row, "col": col, "rows": rows, "cols": cols, "html": "".join(game.grid)}
+    )
+
+
+@app.get("/hint")
+async def hint(request: Request):
+    """tiles the numbers on show prove safe or mined, and one safe tile to try.
+    flags are only trusted with trust_flags=1"""
+    game = Game(request)
+    safe, mines = [], []
+    if game.state.game_started and not game.state.game_over:
+        safe, mines = solver.solve(
+            game.board, request.query_params.get("trust_flags") == "1"
+        )
+    board = game.board
+    safe = ["tileR%dC%d" % board.coords(i) for i in sorted(safe) if not board.flags[i]]
+    mines = ["tileR%dC%d" % board.coords(i) for i in sorted(mines)]
+    return JSONResponse(
+        {"hint": safe[0] if safe else None, "safe": safe, "mines": mines}
+    )
+
+
+@app.get("/log")
+async def game_log(request: Request):
+    """a finished game's seed and moves, enough to replay it exactly"""
+    if not EVENT_LOG:
+        raise HTTPException(status_code=404, detail="Games aren't being logged")
+    game = Game(request)
+    if not game.state.game_over:
+        # the seed places the mines, so it would give the game away
+        raise HTTPException(status_code=403, detail="The game isn't over yet")
+    board = game.board
+    moves = []
+    for move in game.moves:
+        action, i = eventlog.decode(move)
+        moves.append([eventlog.ACTIONS[action], "tileR%dC%d" % board.coords(i)])
+    return JSONResponse(
+        {
+            "rows": game.state.rows,
+            "cols": game.state.cols,
+            "mines": game.state.mine_count,
+            "seed": game.state.seed,
+            "moves": moves,
+        }
+    )
+
+
+def infinite_game(request):
+    """the session's infinite board, or a new one"""
+    blob = request.state.session.get("infinite")
+    if blob:
+        return InfiniteBoard.loads(blob, hot=INFINITE_HOT)
+    return InfiniteBoard(
+        secrets.randbits(63), INFINITE_DENSITY, INFINITE_CHUNK, hot=INFINITE_HOT
+    )
+
+
+def int_params(request, *names):
+    """whole numbers from the query string, or a 400"""
+    try:
+        return [int(request.query_params[name]) for name in names]
+    except (KeyError, ValueError):
+        raise HTTPException(
+            status_code=400, detail=f"Expected numbers {', '.join(names)}"
+        )
+
+
+def on_plane(*coords):
+    """a 400 unless every row and col is within reach of the infinite board"""
+    if any(abs(n) > EDGE for n in coords):
+        raise HTTPException(
+            status_code=400, detail=f"Rows and cols must be within {EDGE} of 0"
+        )
+
+
+@app.get("/infinite/new")
+async def infinite_new(request: Request):
+    """start an infinite board. ?density= mines per thousand tiles"""
+    density = request.query_params.get("density", INFINITE_DENSITY)
+    try:
+        density = int(density)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Density must be a number")
+    if not INFINITE_MIN_DENSITY <= density <= 500:
+        # near 100 the open areas start to join up, and the flood is cut off
+        # half done. none of 400 first clicks at 140 opened more than 1300 tiles
+        raise HTTPException(
+            status_code=400, detail=f"Density must be {INFINITE_MIN_DENSITY} to 500"
+        )
+    game = InfiniteBoard(
+        secrets.randbits(63), density, INFINITE_CHUNK, hot=INFINITE_HOT
+    )
+    request.state.session["infinite"] = game.dumps()
+    return JSONResponse({"density": density, "chunk": INFINITE_CHUNK})
+
+
+@app.get("/infinite/view")
+async def infinite_view(request: Request):
+    """the tiles of a window onto the infinite board, a list per row.
+    '' is covered, 'F' a flag, '*' a mine and '0'-'8' the rest"""
+    row, col, rows, cols = int_params(request, "row", "col", "rows", "cols")
+    if not (0 < rows <= INFINITE_VIEW_MAX and 0 < cols <= INFINITE_VIEW_MAX):
+        raise HTTPException(
+            status_code=400, detail=f"rows and cols must be 1 to {INFINITE_VIEW_MAX}"
+        )
+    on_plane(row, col, row + rows, col + cols)
+    game = infinite_game(request)
+    return JSONResponse(
+        {
+            "row": row,
+            "col": col,
+            "tiles": game.view(row, col, rows, cols),
+            "game_over": game.game_over,
+            "revealed": game.revealed,
+        }
+    )
+
+
+@app.get("/infinite/{action}")
+async def infinite_action(request: Request, action: str):
+    """move, flag or chord at ?row=&col= anywhere. answered with the tiles changed"""
+    act = {"move": "reveal", "flag": "flag", "chord": "chord"}.get(action)
+    if act is None:
+        raise HTTPException(status_code=404, detail="Not an infinite board action")
+    row, col = int_params(request, "row", "col")
+    on_plane(row, col)
+    game = infinite_game(request)
+    changed = getattr(game, act)(row, col)
+    request.state.session["infinite"] = game.dumps()
+    return JSONResponse(
+        {
+            "cells": [[r, c, game.tile(r, c)] for r, c in changed],
+            "game_over": game.game_over,
+            "revealed": game.revealed,
+        }
+    )
 
 
 @app.get("/flag", response_class=HTMLResponse)
 async def flag(request: Request):
-    game = Game(
-        request
-    )  # Pass request into game so it can recover data from the session
+    with PHASE_LATENCY.time("/flag", "game_build"):
+        game = Game(
+            request
+        )  # Pass request into game so it can recover data from the session
 
     # Extract the 'tile' query parameter
     selected_tile = request.query_params.get("tile")
@@ -588,38 +1758,38 @@ async def flag(request: Request):
     # except ValueError:
     # raise HTTPException(status_code=400, detail="Tile parameter must be an integer")
 
-    game.toggle_flag(selected_tile)
-    game.check_winner()
-    game.update_tiles_state()  # Update the state of the game
-    game.load_tiles_from_session()  # Redraw the grid after data updates
-    request.state.session["game"] = asdict(
-        game.state
-    )  # Store the game data in the session
-
-    # Render the board
-    board = main(
-        game.heading,
-        *["".join([str(el) for el in row]) for row in game.grid],
-        Game.js_code,
-        _id="gameboard",
-        _style=f"width:{TILE_SIZE*SIZE}px;",
-    )
-    return HTMLResponse(str(board))
+    with PHASE_LATENCY.time("/flag", "reveal"):
+        game.toggle_flag(selected_tile)
+        game.check_winner()
+
+    with PHASE_LATENCY.time("/flag", "serialize"):
+        game.update_tiles_state()  # Update the state of the game
+        # Store the game data in the session
+        request.state.session["game"] = game.dumps()
+    publish_changes(request.state.session_id, game)
+
+    view = parse_view(request.query_params.get("view"))
+    with PHASE_LATENCY.time("/flag", "render"):
+        if request.query_params.get("diff"):
+            return JSONResponse(game.patch(view))
+
+        # Redraw the grid after data updates
+        board = game.render_board(*(view or (0, 0)))
+        return HTMLResponse(str(board))
 
 
 @app.get("/move", response_class=HTMLResponse)
 async def move(request: Request):
-    print("move!")
-    game = Game(request)
+    with PHASE_LATENCY.time("/move", "game_build"):
+        game = Game(request)
     selected_tile = request.query_params.get("tile")
     if selected_tile is None:
         raise HTTPException(status_code=400, detail="Tile parameter is missing")
 
-    print("Move debug variable:", request.state.session.get("play_debug"))
-    print("Selected tile:", selected_tile)
+    log.debug("move %s", selected_tile)
 
     if game.state.game_over and not game.state.game_started:
-        print('game over!!!!')
+        log.debug("game over")
         # request.state.session.pop("game", None)
         # response.set_cookie(key="session_id", value="", expires=0)
         # return RedirectResponse(url="/")
@@ -627,27 +1797,381 @@ async def move(request: Request):
         response = RedirectResponse(url="/")
         response.set_cookie(key="session_id", value="", expires=0)
         return response
-    elif not game.state.game_started:
-        game.start_game(selected_tile)
-    else:
-        r = game.remove_tiles(selected_tile)
-        if r == "GameOver":
-            print("Game over2222")
+
+    with PHASE_LATENCY.time("/move", "reveal"):
+        game.move(selected_tile)
+        if game.state.game_over:
+            log.debug("game over")
             # return HTMLResponse("Game Over")
 
-    game.check_winner()
-    game.update_tiles_state()
-    game.load_tiles_from_session()
-    request.state.session["game"] = asdict(game.state)
-
-    board = main(
-        game.heading,
-        *["".join([str(el) for el in row]) for row in game.grid],
-        Game.js_code,
-        _id="gameboard",
-        _style=f"width:{TILE_SIZE*SIZE}px;",
+        game.check_winner()
+
+    with PHASE_LATENCY.time("/move", "serialize"):
+        game.update_tiles_state()
+        request.state.session["game"] = game.dumps()
+    publish_changes(request.state.session_id, game)
+
+    view = parse_view(request.query_params.get("view"))
+    with PHASE_LATENCY.time("/move", "render"):
+        if request.query_params.get("diff"):
+            return JSONResponse(game.patch(view))
+
+        board = game.render_board(*(view or (0, 0)))
+        return HTMLResponse(str(board))
+
+
+@app.post("/batch")
+async def batch(request: Request):
+    """several moves, flags and chords in one go, answered with one patch.
+
+    {"actions": [{"action": "chord", "tile": "tileR3C4"}, ...], "view": [row, col]}
+    """
+    try:
+        body = await request.json()
+        actions = [(a["action"], a["tile"]) for a in body["actions"]]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Expected a list of actions")
+    if len(actions) > BATCH_MAX:
+        raise HTTPException(
+            status_code=400, detail=f"At most {BATCH_MAX} actions at a time"
+        )
+    try:
+        view = json_view(body.get("view"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    with PHASE_LATENCY.time("/batch", "game_build"):
+        game = Game(request)
+    # check them all before doing any, so a bad one changes nothing
+    for n, (action, tile) in enumerate(actions):
+        try:
+            game.tile_index(tile)
+        except (KeyError, TypeError):
+            raise HTTPException(status_code=400, detail=f"Bad tile in action {n}")
+        if action not in ("move", "flag", "chord"):
+            raise HTTPException(status_code=400, detail=f"Bad action {n}")
+
+    with PHASE_LATENCY.time("/batch", "reveal"):
+        for action, tile in actions:
+            if game.state.game_over:
+                break
+            game.act(action, tile)
+
+    with PHASE_LATENCY.time("/batch", "serialize"):
+        game.update_tiles_state()
+        request.state.session["game"] = game.dumps()
+    publish_changes(request.state.session_id, game)
+
+    with PHASE_LATENCY.time("/batch", "render"):
+        return JSONResponse(game.patch(view))
+
+
+@app.websocket("/ws")
+async def game_channel(websocket: WebSocket):
+    """a live Game for the connection. takes move, flag, chord and density
+    messages and answers each with a patch like /move?diff=1"""
+    session_id = stored_session_id(websocket.cookies)
+    session = session_store.get_session(session_id) if session_id else {}
+    if not session:
+        # no game to play yet. the page falls back to http
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    websocket.state.session = session
+    game = Game(websocket)
+    saved = session["game"]
+
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"error": "bad message, not json"})
+                continue
+            if not isinstance(message, dict):
+                await websocket.send_json({"error": "bad message, not an object"})
+                continue
+            action = message.get("action")
+            # held like an http request, so a click elsewhere can't be lost
+            async with session_store.lock(session_id):
+                # others playing along, or a tab on http, may have moved since
+                session = session_store.get_session(session_id) or session
+                websocket.state.session = session
+                if session.get("game") != saved:
+                    game = Game(websocket)
+                game.changed = {}
+                try:
+                    view = json_view(message.get("view"))
+                    if action == "density":
+                        if not game.state.game_started:
+                            game.set_mine_density(message["value"])
+                    else:
+                        game.act(action, message["tile"])
+                except (KeyError, ValueError, TypeError) as e:
+                    error = f"bad message {e}"
+                else:
+                    error = None
+                    game.update_tiles_state()
+                    session["game"] = saved = game.dumps()
+                    session_store.update_session(session_id, session)
+            if error:
+                await websocket.send_json({"error": error})
+                continue
+            if action == "density":
+                publish_board(session_id, game)
+            else:
+                publish_changes(session_id, game)
+            await websocket.send_json(game.patch(view))
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/share")
+async def share(request: Request):
+    """share this game. anyone with the links can watch it, or play along"""
+    game = Game(request)
+    request.state.session["game"] = game.dumps()
+    session_id = request.state.session_id
+    if session_id is None:
+        # a session in a cookie. everyone sharing it needs it on the server
+        session_id = request.state.session_id = session_store.create_session()
+    game_id = public_id(session_id)
+    shared[game_id] = session_id
+    shared.move_to_end(game_id)
+    while len(shared) > SHARED_MAX:
+        dropped, _ = shared.popitem(last=False)
+        watch_boards.pop(dropped, None)
+    return JSONResponse(
+        {
+            "game": game_id,
+            "watch": f"/spectate?game={game_id}",
+            "join": f"/join?game={game_id}",
+        }
+    )
+
+
+@app.get("/watch")
+async def watch(request: Request):
+    """a shared game as Server-Sent Events. the board, then a patch per change"""
+    game_id = request.query_params.get("game", "")
+    shared_session(game_id)
+    return StreamingResponse(
+        hub.stream(game_id, watched_board(game_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/spectate", response_class=HTMLResponse)
+async def spectate(request: Request):
+    """a page that follows a shared game, without playing"""
+    game_id = request.query_params.get("game", "")
+    shared_session(game_id)
+    follow = script(_type="text/javascript").html(
+        """
+        var watching = new EventSource('/watch' + location.search);
+        watching.addEventListener("board", function(evt){
+            var board = JSON.parse(evt.data);
+            $("#board").html(board.html).attr(
+                "style", "width:" + board.width + "px;" + board.style
+            );
+            $("#bomb_count").html(board.counter);
+            $("#face h2").html(board.face);
+        });
+        watching.addEventListener("patch", function(evt){
+            var patch = JSON.parse(evt.data);
+            $.each(patch.cells, function(_, cell){
+                $("#" + cell[0]).replaceWith(cell[1]);
+            });
+            $("#bomb_count").html(patch.counter);
+            $("#face h2").html(patch.face);
+        });
+        """
+    )
+    return HTMLResponse(
+        str(
+            html(
+                head(
+                    script(_src="https://code.jquery.com/jquery-3.5.1.min.js"),
+                    link(_rel="stylesheet", _type="text/css", _href=CDN_CSS.MVP),
+                    link(_rel="stylesheet", _type="text/css", _href=sprites.stylesheet),
+                ),
+                body(
+                    main(
+                        header(
+                            h1("💥 Minesweeper 💥"),
+                            h3("💣", div(_id="bomb_count")),
+                            div(h2(), _id="face"),
+                        ),
+                        div(_id="board"),
+                        follow,
+                    )
+                ),
+            )
+        )
+    )
+
+
+@app.get("/join")
+async def join(request: Request):
+    """play along with a shared game, on the same session as whoever shared it"""
+    session_id = shared_session(request.query_params.get("game", ""))
+    response = RedirectResponse(url="/")
+    if SESSION_COOKIE:
+        response.set_cookie(
+            key=SignedCookieSessionMiddleware.cookie,
+            value=session_sealer.seal(encode({"_id": session_id})),
+            httponly=True,
+        )
+    else:
+        response.set_cookie(key="session_id", value=session_id, httponly=True)
+    return response
+
+
+@app.get("/leaderboard")
+async def leaderboard_page(request: Request):
+    """the fastest wins on a board. ?size=16&mines=20&limit=10&offset=0"""
+    try:
+        size, mines, limit, offset = (
+            int(request.query_params.get(name, default))
+            for name, default in (
+                ("size", SIZE),
+                ("mines", GameData.mine_count),
+                ("limit", 10),
+                ("offset", 0),
+            )
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Expected numbers")
+    if not 0 < limit <= LEADERBOARD_TOP or offset < 0:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be 1 to {LEADERBOARD_TOP}"
+        )
+    wins = leaderboard.top(size, size, mines, limit, offset)
+    return JSONResponse(
+        {
+            "size": size,
+            "mines": mines,
+            "wins": [
+                {"rank": offset + n + 1, "seconds": ms / 1000, "won_at": won_at}
+                for n, (ms, won_at) in enumerate(wins)
+            ],
+        }
+    )
+
+
+@app.get("/stats")
+async def stats(request: Request):
+    return JSONResponse(
+        {
+            "render_cache": render_cache.stats(),
+            "sessions": session_store.stats(),
+            "board_pool": board_pool.stats(),
+            "snapshots": snapshots.stats(),
+            "watchers": hub.stats(),
+            "leaderboard": leaderboard.stats(),
+        }
     )
-    return HTMLResponse(str(board))
+
+
+def store_stat(name):
+    return lambda: session_store.stats().get(name, 0)
+
+
+def cache_stat(name):
+    return lambda: render_cache.stats()[name]
+
+
+def pool_stat(name):
+    return lambda: board_pool.stats()[name]
+
+
+METRICS.gauge("minesweeper_sessions", "Live sessions", store_stat("sessions"))
+METRICS.gauge(
+    "minesweeper_session_bytes", "Rough bytes held by sessions", store_stat("bytes")
+)
+METRICS.read_counter(
+    "minesweeper_session_evictions_total",
+    "Sessions evicted to stay in budget",
+    store_stat("evictions"),
+)
+METRICS.read_counter(
+    "minesweeper_session_expirations_total",
+    "Sessions expired unused",
+    store_stat("expirations"),
+)
+METRICS.gauge(
+    "minesweeper_render_cache_hit_rate",
+    "Tile render cache hit rate",
+    cache_stat("hit_rate"),
+)
+METRICS.gauge(
+    "minesweeper_render_cache_bytes",
+    "Bytes of html in the tile render cache",
+    cache_stat("bytes"),
+)
+METRICS.gauge(
+    "minesweeper_board_pool_hit_rate",
+    "First clicks dealt a ready no-guess board",
+    pool_stat("hit_rate"),
+)
+METRICS.gauge(
+    "minesweeper_board_pool_ready",
+    "No-guess boards ready to deal",
+    pool_stat("ready"),
+)
+METRICS.read_counter(
+    "minesweeper_board_pool_generated_total",
+    "No-guess boards made",
+    pool_stat("generated"),
+)
+METRICS.gauge(
+    "minesweeper_board_pool_boards_per_second",
+    "No-guess boards made per second of worker time",
+    pool_stat("boards_per_second"),
+)
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    return PlainTextResponse(
+        METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def require_profiling():
+    if not PROFILING:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+
+
+@app.get("/profile/start")
+async def profile_start(request: Request):
+    """profile the next ?requests=N requests to ?endpoint=/move,/flag"""
+    require_profiling()
+    try:
+        requests = int(request.query_params.get("requests", 50))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="requests must be a number")
+    paths = request.query_params.get("endpoint", "/move,/flag").split(",")
+    if not set(paths) <= {"/move", "/flag"}:
+        raise HTTPException(status_code=400, detail="endpoint must be /move or /flag")
+    profiler.arm(requests, paths)
+    return JSONResponse(profiler.status())
+
+
+@app.get("/profile")
+async def profile(request: Request):
+    """progress of the current run and the hot functions of the last one"""
+    require_profiling()
+    return JSONResponse(profiler.status())
+
+
+@app.get("/profile/collapsed")
+async def profile_collapsed(request: Request):
+    """sampled stacks of the last run, for flamegraph.pl or speedscope"""
+    require_profiling()
+    return PlainTextResponse(profiler.collapsed())
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -659,20 +2183,17 @@ async def play(request: Request):
     if "game" not in request.state.session:
         request.state.session["game"] = None
     game = Game(request)
-    request.state.session["game"] = asdict(game.state)
+    request.state.session["game"] = game.dumps()
+    session_id = request.state.session_id
+    if session_id is not None and public_id(session_id) in shared:
+        game.shared_as = public_id(session_id)
 
     # Debugging: Add a session variable to check if it's set correctly
     request.state.session["play_debug"] = "play_method_called"
 
-    print("Play debug variable:", request.state.session.get("play_debug"))
+    log.debug("play debug variable: %s", request.state.session.get("play_debug"))
 
-    board = main(
-        game.heading,
-        *["".join([str(el) for el in row]) for row in game.grid],
-        Game.js_code,
-        _id="gameboard",
-        _style=f"width:{TILE_SIZE*SIZE}px;",
-    )
+    board = game.render_board()
     return HTMLResponse(
         str(
             html(
@@ -680,6 +2201,7 @@ async def play(request: Request):
                     jquery,
                     link(_rel="stylesheet", _type="text/css", _href=CDN_CSS.MVP),
                     link(_rel="stylesheet", _type="text/css", _href=CDN_CSS.BALLOON),
+                    link(_rel="stylesheet", _type="text/css", _href=sprites.stylesheet),
                 ),
                 body(str(board)),
             )
@@ -0,0 +1,153 @@
+"""
+On-demand profiling of live requests.
+
+Arm the profiler for the next N requests to some endpoints and each of
+them runs under cProfile while a sampling thread records its stack. When
+the last one finishes the hot functions are summarised, and the cProfile
+stats and a flamegraph-ready collapsed-stack file are written out.
+
+Only wired in when MINESWEEPER_PROFILING=1, see minesweeper.py.
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+def collapse(frame):
+    """a frame's stack as 'outer;...;inner', the format flamegraph.pl reads"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """count the stacks another thread is in, every interval seconds"""
+
+    def __init__(self, thread_id, stacks, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = stacks
+        self.interval = interval
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+
+class Profiler(object):
+    def __init__(self, out_dir="profiles", interval=0.001):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.paths = set()
+        self.remaining = 0
+        self.active = False
+        self.requests = 0
+        self.cprofile = None
+        self.stacks = Counter()
+        self.last = None
+
+    def arm(self, requests, paths):
+        """profile the next `requests` requests to any of paths"""
+        self.paths = set(paths)
+        self.remaining = requests
+        self.requests = 0
+        self.cprofile = cProfile.Profile()
+        self.stacks = Counter()
+
+    def wants(self, path):
+        # one at a time. anything else running on the event loop meanwhile
+        # still shows up, so profile on a quiet worker where you can
+        return self.remaining > 0 and not self.active and path in self.paths
+
+    @contextmanager
+    def profile(self):
+        self.active = True
+        self.remaining -= 1
+        sampler = Sampler(threading.get_ident(), self.stacks, self.interval)
+        sampler.start()
+        self.cprofile.enable()
+        try:
+            yield
+        finally:
+            self.cprofile.disable()
+            sampler.stop()
+            self.active = False
+            self.requests += 1
+            if self.remaining == 0:
+                self.finish()
+
+    def hot_functions(self, limit=25):
+        """the functions with the most time of their own"""
+        stats = pstats.Stats(self.cprofile).stats
+        rows = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items():
+            rows.append(
+                {
+                    "function": f"{name} ({os.path.basename(filename)}:{line})",
+                    "calls": calls,
+                    "tottime": tottime,
+                    "cumtime": cumtime,
+                }
+            )
+        rows.sort(key=lambda r: r["tottime"], reverse=True)
+        return rows[:limit]
+
+    def collapsed(self):
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def finish(self):
+        """summarise the run and write the .prof and .collapsed files"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.join(self.out_dir, time.strftime("%Y%m%d-%H%M%S"))
+        self.cprofile.dump_stats(stem + ".prof")
+        with open(stem + ".collapsed", "w") as f:
+            f.write(self.collapsed())
+        self.last = {
+            "requests": self.requests,
+            "paths": sorted(self.paths),
+            "prof": stem + ".prof",
+            "collapsed": stem + ".collapsed",
+            "hot_functions": self.hot_functions(),
+        }
+
+    def status(self):
+        return {
+            "remaining": self.remaining,
+            "profiled": self.requests,
+            "paths": sorted(self.paths),
+            "last": self.last,
+        }
+
+
+class ProfilingMiddleware(object):
+    """ASGI middleware that hands matching requests to the profiler"""
+
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.wants(scope["path"]):
+            return await self.app(scope, receive, send)
+        with self.profiler.profile():
+            await self.app(scope, receive, send)
@@ -0,0 +1,101 @@
+"""
+Session data sealed into a cookie, so the server doesn't have to keep it.
+
+The session is compressed and sealed with AES-GCM from the cryptography
+package, so the mines in a game can't be read from the cookie and the
+token is rejected if anything in it was changed. The key is derived from
+one secret, and the version byte is authenticated along with the data.
+
+    token = base64url(version:B | nonce:12 | AES-GCM ciphertext and tag)
+    plaintext = issued:d | zlib(json of the session)
+
+Bytes values, like a codec game, are kept as base64 inside the json.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import struct
+import zlib
+from time import time
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:  # cryptography is optional, only cookie sessions need it
+    AESGCM = None
+
+VERSION = 2
+NONCE = 12
+TAG = 16
+ISSUED = struct.Struct(">d")
+
+
+def derive(secret, purpose):
+    return hmac.new(secret, purpose, hashlib.sha256).digest()
+
+
+def encode(session):
+    """a session dict -> bytes"""
+    return json.dumps(
+        {
+            key: (
+                ["b", base64.b64encode(value).decode()]
+                if isinstance(value, (bytes, bytearray))
+                else ["j", value]
+            )
+            for key, value in session.items()
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
+def decode(data):
+    """bytes made by encode -> the session dict"""
+    return {
+        key: base64.b64decode(value) if kind == "b" else value
+        for key, (kind, value) in json.loads(data).items()
+    }
+
+
+class Sealer(object):
+    def __init__(self, secret, ttl=None):
+        if AESGCM is None:
+            raise RuntimeError(
+                "session cookies need the cryptography package."
+                " pip install cryptography"
+            )
+        self.cipher = AESGCM(derive(secret, b"minesweeper session cipher"))
+        self.ttl = ttl  # seconds a token is accepted for after it's made
+
+    def seal(self, plain):
+        """encoded session bytes -> token"""
+        plain = ISSUED.pack(time()) + zlib.compress(plain)
+        version = bytes([VERSION])
+        nonce = os.urandom(NONCE)
+        body = version + nonce + self.cipher.encrypt(nonce, plain, version)
+        return base64.urlsafe_b64encode(body).rstrip(b"=").decode()
+
+    def unseal(self, token):
+        """token -> encoded session bytes. None if it was tampered with or is too old"""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) < 1 + NONCE + TAG + ISSUED.size or raw[0] != VERSION:
+            return None
+        nonce, cipher = raw[1 : 1 + NONCE], raw[1 + NONCE :]
+        try:
+            plain = self.cipher.decrypt(nonce, cipher, raw[:1])
+        except InvalidTag:
+            return None
+        (issued,) = ISSUED.unpack_from(plain)
+        if self.ttl is not None and time() - issued > self.ttl:
+            return None
+        try:
+            return zlib.decompress(plain[ISSUED.size :])
+        except zlib.error:
+            return None
@@ -0,0 +1,277 @@
+"""
+Headless self-play, to see how winnable each board size and density is.
+
+Plays games on a bare Board with the same rules as minesweeper.Game, but
+without FastAPI or domonic, spread over worker processes. Every game has
+its own seed, made from --seed, the board and the game's number, so a run
+can be repeated exactly however many workers there are. Totals for each
+size and density are printed as batches finish.
+
+    python simulate.py --sizes 8 12 16 --densities 10 20 30 --games 100000
+    python simulate.py --strategy random --games 1000 --out results.jsonl
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import solver
+from board import Board
+
+
+class Headless(object):
+    """the rules of minesweeper.Game on a Board, with nothing drawn"""
+
+    def __init__(self, rows, cols, mine_count, rng):
+        self.board = Board(rows, cols)
+        self.mine_count = mine_count
+        self.rng = rng
+        self.game_started = False
+        self.game_over = False
+        self.won = False
+        self.moves = 0
+        self.flags = 0
+
+    def start_game(self, i):
+        self.game_started = True
+        self.board.place_mines(self.mine_count, i, self.rng)
+        self.mine_count = self.board.mine_count
+        self.board.count_neighbours()
+        return self.remove_tiles(i)
+
+    def remove_tiles(self, i):
+        if self.game_over:
+            return []
+        self.moves += 1
+        revealed = self.board.reveal(i)
+        if any(self.board.mines[j] for j in revealed):
+            self.game_over = True
+        return revealed
+
+    def move(self, i):
+        if not self.game_started:
+            return self.start_game(i)
+        return self.remove_tiles(i)
+
+    def toggle_flag(self, i):
+        board = self.board
+        if board.visible[i] or self.game_over:
+            return
+        self.flags += 1
+        board.flags[i] ^= 1
+
+    def check_winner(self):
+        target = self.board.n - self.mine_count
+        if not self.game_over and self.board.visible.count(1) == target:
+            self.game_over = self.won = True
+        return self.won
+
+
+def random_covered(game, rng):
+    """a covered, unflagged tile picked at random"""
+    board = game.board
+    visible = board.visible
+    flags = board.flags
+    for _ in range(16):
+        i = rng.randrange(board.n)
+        if not visible[i] and not flags[i]:
+            return i
+    return rng.choice([i for i in range(board.n) if not visible[i] and not flags[i]])
+
+
+class RandomPlayer(object):
+    """clicks anywhere still covered"""
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def actions(self, game):
+        return [("move", random_covered(game, self.rng))]
+
+
+class SolverPlayer(object):
+    """clicks every tile the solver proves safe and flags the ones it proves
+    are mines. guesses at random only when it's stuck"""
+
+    def __init__(self, rng):
+        self.rng = rng
+
+    def actions(self, game):
+        if not game.game_started:
+            return [("move", random_covered(game, self.rng))]
+        board = game.board
+        safe, mines = solver.solve(board, trust_flags=True)
+        found = [("flag", i) for i in sorted(mines) if not board.flags[i]]
+        found += [("move", i) for i in sorted(safe)]
+        return found or [("move", random_covered(game, self.rng))]
+
+
+STRATEGIES = {"random": RandomPlayer, "solver": SolverPlayer}
+
+
+def strategy(name):
+    """a strategy by name, or 'module:Class' for your own. it's made with the
+    game's rng and asked for actions() until the game is over"""
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def play(rows, cols, mines, player, rng):
+    """play one game to the end -> the finished Headless game"""
+    game = Headless(rows, cols, mines, rng)
+    while not game.game_over:
+        for action, i in player.actions(game):
+            if action == "flag":
+                game.toggle_flag(i)
+            else:
+                game.move(i)
+                if game.game_over:
+                    break
+        game.check_winner()
+    return game
+
+
+def play_batch(size, mines, strategy_name, seed, start, count):
+    """play games start..start+count of one size and density -> their totals"""
+    make_player = strategy(strategy_name)
+    totals = {"games": 0, "wins": 0, "moves": 0, "flags": 0, "seconds": 0.0}
+    for number in range(start, start + count):
+        rng = random.Random(f"{seed}-{size}-{mines}-{number}")
+        began = time.perf_counter()
+        game = play(size, size, mines, make_player(rng), rng)
+        totals["seconds"] += time.perf_counter() - began
+        totals["games"] += 1
+        totals["wins"] += game.won
+        totals["moves"] += game.moves
+        totals["flags"] += game.flags
+    return totals
+
+
+def summary(size, mines, totals):
+    games = totals["games"] or 1
+    return {
+        "size": size,
+        "density": mines,
+        "games": totals["games"],
+        "win_rate": totals["wins"] / games,
+        "moves": totals["moves"] / games,
+        "flags": totals["flags"] / games,
+        "ms_per_game": totals["seconds"] / games * 1000,
+    }
+
+
+def simulate(
+    sizes, densities, games, strategy_name="solver", seed=0, workers=None, batch=500
+):
+    """play games of every size and density over a process pool.
+
+    Yields the running summary of a size and density each time one of its
+    batches finishes.
+    """
+    strategy(strategy_name)  # fail here rather than in every worker
+    totals = {}
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {}
+        for size in sizes:
+            for mines in densities:
+                totals[size, mines] = {
+                    "games": 0,
+                    "wins": 0,
+                    "moves": 0,
+                    "flags": 0,
+                    "seconds": 0.0,
+                }
+                for start in range(0, games, batch):
+                    future = executor.submit(
+                        play_batch,
+                        size,
+                        mines,
+                        strategy_name,
+                        seed,
+                        start,
+                        min(batch, games - start),
+                    )
+                    futures[future] = (size, mines)
+        for future in as_completed(futures):
+            key = futures[future]
+            for name, value in future.result().items():
+                totals[key][name] += value
+            yield summary(*key, totals[key])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 12, 16])
+    parser.add_argument(
+        "--densities",
+        type=int,
+        nargs="+",
+        default=[10, 20, 30, 40],
+        help="mines per game, like the density slider",
+    )
+    parser.add_argument("--games", type=int, default=10000, help="per size and density")
+    parser.add_argument(
+        "--strategy",
+        default="solver",
+        help="%s, or module:Class" % ", ".join(sorted(STRATEGIES)),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch", type=int, default=500, help="games per task")
+    parser.add_argument(
+        "--every", type=float, default=1.0, help="seconds between progress lines"
+    )
+    parser.add_argument("--out", help="append the final summaries here as JSON lines")
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    shown = 0.0
+    latest = {}
+    for result in simulate(
+        args.sizes,
+        args.densities,
+        args.games,
+        args.strategy,
+        args.seed,
+        args.workers,
+        args.batch,
+    ):
+        latest[result["size"], result["density"]] = result
+        now = time.monotonic()
+        if now - shown >= args.every:
+            shown = now
+            played = sum(r["games"] for r in latest.values())
+            print(
+                f"{now - start:7.1f}s {played} games ({played / (now - start):.0f}/s) "
+                f"size={result['size']} density={result['density']} "
+                f"games={result['games']} win_rate={result['win_rate']:.3f}",
+                flush=True,
+            )
+
+    elapsed = time.monotonic() - start
+    played = sum(r["games"] for r in latest.values())
+    print(f"{played} games in {elapsed:.1f}s ({played / elapsed:.0f}/s)")
+    print(
+        f"{'size':>5} {'density':>8} {'games':>9} {'win rate':>9} {'moves':>7} {'flags':>7} {'ms/game':>8}"
+    )
+    for (size, mines), r in sorted(latest.items()):
+        print(
+            f"{size:>5} {mines:>8} {r['games']:>9} {r['win_rate']:>9.3f} "
+            f"{r['moves']:>7.1f} {r['flags']:>7.1f} {r['ms_per_game']:>8.3f}"
+        )
+    if args.out:
+        with open(args.out, "a") as f:
+            for _, r in sorted(latest.items()):
+                f.write(json.dumps(r) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Constraint propagation solver.
+
+Works only from what a player can see: the uncovered numbers, and
+optionally their flags. Finds tiles that are certainly safe or certainly
+mines, without guessing.
+
+Each uncovered number gives a constraint "exactly need of these covered
+tiles are mines". Constraints that share tiles form a frontier group, and
+each group is solved on its own, with its tiles numbered locally so a set
+of tiles is a small int bitset. Within a group it uses
+
+- single-tile rules: need == 0 means all safe, need == size means all mines
+- subset rules: if A's tiles are inside B's, B - A holds B.need - A.need mines
+- overlap rules: if B - A must hold B.need - A.need mines and that's all of
+  it, then those are mines and A - B is safe
+
+until nothing new is learnt.
+"""
+
+from collections import defaultdict, deque
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # before python 3.10
+
+    def popcount(mask):
+        return bin(mask).count("1")
+
+
+def bits(mask):
+    """the positions of the set bits"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def constraints(board, trust_flags=False):
+    """(covered tiles, mines among them) for every uncovered number.
+
+    With trust_flags the player's flags count as known mines.
+    """
+    visible = board.visible
+    mines = board.mines
+    counts = board.counts
+    flags = board.flags if trust_flags else bytes(board.n)
+    offsets = board.offsets
+    indices = board.indices
+    found = []
+    for i in range(board.n):
+        if not visible[i] or mines[i] or not counts[i]:
+            continue
+        covered = []
+        need = counts[i]
+        for j in indices[offsets[i] : offsets[i + 1]]:
+            if visible[j]:
+                continue
+            if flags[j]:
+                need -= 1
+            else:
+                covered.append(j)
+        if covered:
+            found.append((covered, need))
+    return found
+
+
+def frontier_groups(found):
+    """split constraints into groups that share no tiles"""
+    parent = {}
+
+    def root(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for covered, _ in found:
+        first = root(covered[0])
+        for j in covered[1:]:
+            parent[root(j)] = first
+
+    groups = defaultdict(list)
+    for covered, need in found:
+        groups[root(covered[0])].append((covered, need))
+    return list(groups.values())
+
+
+class Group(object):
+    """one frontier group's rules.
+
+    Tiles are numbered locally in board order. A rule is kept by its sorted
+    tiles, with the number of its lowest tile and a bitset of its tiles
+    from there for comparing it against others, which keeps the ints small
+    however big the group gets.
+
+    A queue of rules to look at is worked through. When tiles become known
+    every rule mentioning them is rewritten and queued again.
+    """
+
+    def __init__(self, group):
+        self.tiles = sorted({j for covered, _ in group for j in covered})
+        local = {j: n for n, j in enumerate(self.tiles)}
+        self.rules = {}  # tiles -> (mines in them, base, mask)
+        self.by_tile = defaultdict(set)
+        self.queue = deque()
+        self.safe = set()
+        self.mine = set()
+        for covered, need in group:
+            self.add(sorted(local[j] for j in covered), need)
+
+    def add(self, tiles, need):
+        safe, mine = self.safe, self.mine
+        if not (safe.isdisjoint(tiles) and mine.isdisjoint(tiles)):
+            need -= len(mine.intersection(tiles))
+            tiles = [t for t in tiles if t not in safe and t not in mine]
+            if not tiles:
+                return
+        key = tuple(tiles)
+        if key in self.rules:
+            return
+        base = key[0]
+        mask = 0
+        for t in key:
+            mask |= 1 << (t - base)
+        self.rules[key] = (need, base, mask)
+        for t in key:
+            self.by_tile[t].add(key)
+        self.queue.append(key)
+
+    def remove(self, key):
+        for t in key:
+            self.by_tile[t].discard(key)
+        return self.rules.pop(key)[0]
+
+    def settle(self, tiles, mine):
+        """mark tiles safe or mined and rewrite the rules that mention them"""
+        known = self.mine if mine else self.safe
+        touched = set()
+        for t in tiles:
+            if t not in self.safe and t not in self.mine:
+                known.add(t)
+                touched.update(self.by_tile.pop(t, ()))
+        for key in touched:
+            if key in self.rules:
+                self.add(key, self.remove(key))
+
+    def compare(self, a, b):
+        """what a's rule says about b's tiles"""
+        rule_a = self.rules.get(a)
+        rule_b = self.rules.get(b)
+        if rule_a is None or rule_b is None:
+            return
+        need_a, base_a, mask_a = rule_a
+        need_b, base_b, mask_b = rule_b
+        base = min(base_a, base_b)
+        mask_a <<= base_a - base
+        mask_b <<= base_b - base
+        only_a = mask_a & ~mask_b
+        only_b = mask_b & ~mask_a
+        if not only_b:
+            return
+        diff = need_b - need_a
+        if diff == popcount(only_b):
+            self.settle([base + t for t in bits(only_b)], True)
+            self.settle([base + t for t in bits(only_a)], False)
+        elif not only_a:
+            self.add([base + t for t in bits(only_b)], diff)
+
+    def run(self):
+        """-> (safe, mines) tiles"""
+        rules = self.rules
+        by_tile = self.by_tile
+        queue = self.queue
+        pending = deque()  # rules the single-tile rules couldn't settle
+        while queue or pending:
+            # the cheap rules first, so pairs are only compared once those
+            # have run out and fewer rules are still changing
+            if queue:
+                a = queue.popleft()
+                rule = rules.get(a)
+                if rule is None:
+                    continue
+                if rule[0] == 0:
+                    self.settle(a, False)
+                elif rule[0] == len(a):
+                    self.settle(a, True)
+                else:
+                    pending.append(a)
+                continue
+            a = pending.popleft()
+            if a not in rules:
+                continue
+            others = set()
+            for t in a:
+                others.update(by_tile[t])
+            others.discard(a)
+            for b in others:
+                self.compare(a, b)
+                self.compare(b, a)
+        return (
+            {self.tiles[t] for t in self.safe},
+            {self.tiles[t] for t in self.mine},
+        )
+
+
+def solve(board, trust_flags=False):
+    """-> (safe, mines): sets of covered board indexes that are certain"""
+    safe = set()
+    mines = set()
+    for group in frontier_groups(constraints(board, trust_flags)):
+        group_safe, group_mines = Group(group).run()
+        safe |= group_safe
+        mines |= group_mines
+    return safe, mines
+
+
+def hint(board, trust_flags=False):
+    """a covered, unflagged tile that's certainly safe, or None"""
+    safe, _ = solve(board, trust_flags)
+    for i in sorted(safe):
+        if not board.flags[i]:
+            return i
+    return None
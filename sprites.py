@@ -0,0 +1,114 @@
+"""
+The cover image and tile icons, prepared once at startup for caching.
+
+The cover is scaled to the default board's size (with Pillow, if it's
+installed) and every image is written out under a name with a hash of its
+content in it, next to a stylesheet with a class for each icon and for each
+row and column of the cover. Tiles are then just class names, and since a
+hashed url never changes what it points at, browsers can keep them for a
+year without asking again.
+
+    .cover.sr3.sc4  the cover, shifted to row 3 column 4
+    .flag .bomb .clear .n1 ... .n8
+"""
+
+import hashlib
+import io
+import os
+
+from fastapi.staticfiles import StaticFiles
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, without it the browser does the scaling
+    Image = None
+
+YEAR = 365 * 24 * 60 * 60
+
+
+def scaled(path, size, kind):
+    """the image at path resized to size as kind ('JPEG', 'PNG'), or its bytes as is"""
+    if Image is None:
+        with open(path, "rb") as f:
+            return f.read()
+    with Image.open(path) as img:
+        if kind == "JPEG":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.resize(size, Image.LANCZOS).save(out, kind)
+        return out.getvalue()
+
+
+class Sprites(object):
+    def __init__(self, out_dir="static", url="/static"):
+        self.out_dir = out_dir
+        self.url = url
+        self.names = {}  # image path -> class name
+        self.stylesheet = None
+
+    def write(self, name, ext, data):
+        """save data under a content-hashed name -> that name"""
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        filename = f"{name}-{digest}{ext}"
+        path = os.path.join(self.out_dir, filename)
+        if not os.path.exists(path):
+            # other workers may be writing the same file
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return filename
+
+    def build(self, cover, icons, tile_size, size, max_size):
+        """write out the cover, the icons {class name: path} and the stylesheet"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        ext = ".jpg" if Image is not None else os.path.splitext(cover)[1]
+        side = tile_size * size
+        cover_file = self.write("cover", ext, scaled(cover, (side, side), "JPEG"))
+        self.names = {cover: "cover"}
+
+        rules = [
+            f"button.tile{{padding:0;margin:0;border:none;border-style:solid;"
+            f"width:{tile_size}px;height:{tile_size}px;background-color:white}}",
+            f".tile>div{{width:100%;height:100%;background-size:{tile_size}px {tile_size}px}}",
+            # the board sets --cover-size to its own width and height
+            f".tile>.cover{{background-image:url({cover_file});"
+            f"background-size:var(--cover-size,{side}px {side}px)}}",
+        ]
+        for name, path in icons.items():
+            ext = ".png" if Image is not None else os.path.splitext(path)[1]
+            icon_file = self.write(
+                name, ext, scaled(path, (tile_size, tile_size), "PNG")
+            )
+            self.names[path] = name
+            rules.append(f".{name}{{background-image:url({icon_file})}}")
+        for i in range(max_size):
+            rules.append(f".sr{i}{{background-position-y:-{i * tile_size}px}}")
+            rules.append(f".sc{i}{{background-position-x:-{i * tile_size}px}}")
+
+        css = "\n".join(rules).encode()
+        self.stylesheet = f"{self.url}/{self.write('sprites', '.css', css)}"
+        return self
+
+    def classes(self, image_path, row, col):
+        """the class names a tile showing image_path at row, col needs"""
+        name = self.names[image_path]
+        if name == "cover":
+            return f"cover sr{row} sc{col}"
+        return name
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with a Cache-Control header. starlette already does the
+    ETag and Last-Modified, and answers If-None-Match with a 304"""
+
+    def __init__(self, *args, max_age=3600, immutable=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}"
+        if immutable:
+            self.cache_control += ", immutable"
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = self.cache_control
+        return response